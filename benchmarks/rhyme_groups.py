@@ -0,0 +1,103 @@
+'''
+Microbenchmark of per-poem group and hybrid labeling latency, comparing
+the union-find implementation of RhymeLabeler with the networkx graph
+construction it replaced. Requires networkx for the "before" numbers.
+
+    python3 benchmarks/rhyme_groups.py --poems 2000
+'''
+
+import optparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import networkx as nx
+
+from rhyme_labeler import SONNET_LENGTH, RhymeLabeler
+
+class NetworkxRhymeLabeler(RhymeLabeler):
+    '''
+    RhymeLabeler with the networkx-based group and hybrid helpers
+    it used before the union-find engine.
+    '''
+
+    def _get_rhyme_groups(self, words):
+        G = nx.Graph()
+        G.add_nodes_from(range(len(words)))
+        self.add_rhymes(words, self.rhyme_dict)
+        for i in range(len(words)):
+            word = words[i]
+            for j in range(len(words)):
+                other_word = words[j]
+                if other_word in self.rhyme_dict[word]:
+                    G.add_edge(i, j)
+        return [list(s) for s in list(nx.connected_components(G))]
+
+    def _combine_schemes(self, rhyme_scheme, rhyme_scheme_2):
+        G = nx.Graph()
+        for group in rhyme_scheme + rhyme_scheme_2:
+            for i in range(len(group)):
+                for j in range(i+1, len(group)):
+                    G.add_edge(group[i], group[j])
+        return [list(s) for s in list(nx.connected_components(G))]
+
+def make_workload(num_poems, seed):
+    '''
+    Make random sonnet end words over a vocabulary of rhyme classes.
+    :return: the end words of every poem and a warm rhyme dictionary.
+    '''
+    rand = random.Random(seed)
+    vocabulary = ['w%d_%d' % (c, k) for c in range(200) for k in range(10)]
+    rhyme_dict = {word: [other for other in vocabulary
+                         if other != word
+                         and other.split('_')[0] == word.split('_')[0]]
+                  for word in vocabulary}
+    poems = [[rand.choice(vocabulary) for _ in range(SONNET_LENGTH)]
+             for _ in range(num_poems)]
+    return poems, rhyme_dict
+
+def no_rhymes_to_add(words, rhyme_dict):
+    pass
+
+def time_per_poem(labeler, poems, scheme, group, repeat):
+    '''
+    :return: the best mean latency per poem in microseconds.
+    '''
+    timer = timeit.Timer(lambda: [labeler._label_words(words, scheme, group)
+                                  for words in poems])
+    return min(timer.repeat(repeat=repeat, number=1)) / len(poems) * 1e6
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--poems", type="int", default=1000,
+                      help="Number of poems to label.")
+    parser.add_option("--repeat", type="int", default=5,
+                      help="Number of timed runs; the best is kept.")
+    parser.add_option("--seed", type="int", default=0)
+    (options, args) = parser.parse_args()
+
+    poems, rhyme_dict = make_workload(options.poems, options.seed)
+    # Without early exits, so that both compare every pair of lines.
+    before = NetworkxRhymeLabeler(no_rhymes_to_add, rhyme_dict,
+                                  confidence_threshold=None)
+    after = RhymeLabeler(no_rhymes_to_add, rhyme_dict,
+                         confidence_threshold=None)
+
+    for name, scheme, group in [('group', False, True),
+                                ('hybrid', True, True)]:
+        for words in poems:
+            if (before._label_words(words, scheme, group)
+                    != after._label_words(words, scheme, group)):
+                sys.exit('%s labels differ for %s' % (name, words))
+        before_us = time_per_poem(before, poems, scheme, group,
+                                  options.repeat)
+        after_us = time_per_poem(after, poems, scheme, group,
+                                 options.repeat)
+        print('%-6s networkx: %8.1f us/poem  union-find: %8.1f us/poem '
+              '(%.1fx)' % (name, before_us, after_us, before_us / after_us))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+'''
+Startup benchmark of the sonnet-analysis command line and of importing
+each module, in fresh interpreters, reported as JSON tagged with the
+git commit:
+
+    python3 benchmarks/startup.py --runs 20 --output startup.json
+
+--max-ms fails the run if the --help of any subcommand (or of the
+command itself) takes longer, net of bare interpreter startup.
+'''
+
+import json
+import optparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+
+from suite import git_commit
+
+CLI = os.path.join(ROOT, 'sonnet_analysis.py')
+SUBCOMMANDS = ['ingest', 'label', 'stats', 'graph', 'export', 'index',
+               'query']
+MODULES = ['sonnet_analysis', 'data_loader', 'rhyme_labeler',
+           'corpus_stats', 'rhyme_graph', 'sequence_stats',
+           'columnar_corpus', 'labeling_service', 'generate_dataset',
+           'end_word_index']
+
+def time_command(command, runs):
+    '''
+    Run a command in fresh processes.
+    :return: the fastest and the median wall time, in milliseconds.
+    '''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1e3)
+    times.sort()
+    return {'min_ms': times[0], 'median_ms': times[len(times) // 2]}
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--runs", type="int", default=10,
+                      help="Number of runs of each command.")
+    parser.add_option("--output",
+                      help="File to write the JSON results to, instead "
+                           "of standard output.")
+    parser.add_option("--max-ms", type="float",
+                      help="Fail if a --help takes longer than this, net "
+                           "of interpreter startup (median).")
+    (options, args) = parser.parse_args()
+
+    baseline = time_command([sys.executable, '-c', 'pass'], options.runs)
+    results = {'commit': git_commit(),
+               'python': sys.version.split()[0],
+               'interpreter': baseline,
+               'cli': {},
+               'imports': {}}
+    for name in [None] + SUBCOMMANDS:
+        command = [sys.executable, CLI] + ([name] if name else []) + ['--help']
+        results['cli'][name or 'sonnet-analysis'] = time_command(
+            command, options.runs)
+    for module in MODULES:
+        results['imports'][module] = time_command(
+            [sys.executable, '-c', 'import ' + module], options.runs)
+    for timings in list(results['cli'].values()) + list(
+            results['imports'].values()):
+        timings['net_median_ms'] = (timings['median_ms']
+                                    - baseline['median_ms'])
+
+    report = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+    if options.max_ms is not None:
+        slow = [name for name, timings in results['cli'].items()
+                if timings['net_median_ms'] > options.max_ms]
+        if slow:
+            sys.exit('slow startup: %s' % ', '.join(slow))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+'''
+Benchmark of the labeler and loader hot paths on a synthetic corpus
+(see synthetic.py), reported as JSON so runs can be compared across
+commits:
+
+    python3 benchmarks/suite.py --poems 10000 --output before.json
+
+Each stage reports its throughput and, when timed poem by poem, its
+latency percentiles; the peak RSS is sampled after every stage. Since
+the true rhyme groups of the corpus are known, the accuracy of every
+labeling mode is reported too, and --check fails the run if group
+labeling does not find them exactly. The scheme memo hits and misses
+of each mode are reported under "scheme_memo", and the number of
+labels of each source (hybrid labels with the "scheme" source skipped
+the group pass) under "label_sources".
+'''
+
+import collections
+import json
+import optparse
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import SCHEMES, make_corpus, make_rhyme_classes, make_rhyme_dict
+
+from data_loader import DataLoader
+from packed_corpus import write_packed
+from rhyme_labeler import RhymeLabeler
+from sequence_stats import SequenceStats
+
+MODES = [('scheme', True, False), ('group', False, True),
+         ('hybrid', True, True)]
+PERCENTILES = [50, 90, 99]
+
+def no_rhymes_to_add(words, rhyme_dict):
+    pass
+
+def git_commit():
+    '''
+    :return: the commit of the checkout being benchmarked, or None.
+    '''
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def peak_rss_kb():
+    '''
+    :return: the peak resident set size of the process so far, in KB.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def summarize(latencies, items=None):
+    '''
+    Summarize per-item latencies.
+    :param latencies: the latency of every item, in seconds.
+    :param items: the number of items, if not one per latency.
+    :return: the statistics of a stage, in microseconds.
+    '''
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    stats = {'items': len(latencies) if items is None else items,
+             'seconds': total,
+             'per_second': (len(latencies) if items is None else items)
+                           / total if total else None,
+             'peak_rss_kb': peak_rss_kb()}
+    if items is None and latencies:
+        for p in PERCENTILES:
+            rank = min(len(latencies) - 1, len(latencies) * p // 100)
+            stats['p%d_us' % p] = latencies[rank] * 1e6
+    return stats
+
+def time_each(function, items):
+    '''
+    Call a function on every item, timing each call.
+    :return: the results and the latencies.
+    '''
+    results, latencies = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(function(item))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+def time_once(function):
+    '''
+    :return: the result of a call and its duration.
+    '''
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def accuracy(labels, truths):
+    '''
+    Compare labels with the true rhyme groups.
+    :return: the rate of exactly labeled poems, and the precision and
+    recall of the rhyming line pairs.
+    '''
+    def pairs(scheme):
+        return {(i, j) for group in scheme for i in group for j in group
+                if i < j}
+    exact = found = labeled = true = 0
+    for label, truth in zip(labels, truths):
+        exact += label == truth
+        label_pairs, true_pairs = pairs(label), pairs(truth)
+        found += len(label_pairs & true_pairs)
+        labeled += len(label_pairs)
+        true += len(true_pairs)
+    return {'exact': exact / len(truths) if truths else None,
+            'pair_precision': found / labeled if labeled else None,
+            'pair_recall': found / true if true else None}
+
+def bench_loader(poems, dir, packed):
+    '''
+    Time writing the corpus and streaming it back with a DataLoader.
+    '''
+    if packed:
+        path = os.path.join(dir, 'corpus.pack')
+        _, write_seconds = time_once(lambda: write_packed(poems, path))
+    else:
+        path = os.path.join(dir, 'corpus')
+        os.makedirs(path)
+        data = DataLoader(path)
+        for poem in poems:
+            data.poems[poem.title] = poem
+        _, write_seconds = time_once(data.write)
+    write = summarize([write_seconds], len(poems))
+    _, load_seconds = time_once(
+        lambda: sum(1 for _ in DataLoader(path).iter_poems()))
+    return write, summarize([load_seconds], len(poems)), path
+
+def run(options):
+    classes = make_rhyme_classes(options.classes)
+    poems, truths = make_corpus(options.poems, classes, options.seed,
+                                options.schemes)
+    labeler = RhymeLabeler(no_rhymes_to_add, make_rhyme_dict(classes))
+    results = {'commit': git_commit(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'options': {'poems': options.poems,
+                           'classes': options.classes,
+                           'seed': options.seed,
+                           'schemes': options.schemes or list(SCHEMES),
+                           'packed': options.packed},
+               'stages': {},
+               'accuracy': {},
+               'scheme_memo': {},
+               'label_sources': {}}
+    stages = results['stages']
+
+    dir = tempfile.mkdtemp(prefix='sonnet_bench_')
+    try:
+        stages['loader_write'], stages['loader_load'], path = bench_loader(
+            poems, dir, options.packed)
+
+        labels = {}
+        for name, scheme, group in MODES:
+            # Each mode starts from an empty scheme memo.
+            labeler.invalidate_rhymes()
+            memo_start = labeler.scheme_memo_stats()
+            rhyme_labels, latencies = time_each(
+                lambda poem: labeler.get_rhyme_label(poem, scheme, group),
+                poems)
+            labels[name] = [label.rhyme_scheme for label in rhyme_labels]
+            stages[name] = summarize(latencies)
+            results['label_sources'][name] = dict(collections.Counter(
+                label.source for label in rhyme_labels))
+            memo = labeler.scheme_memo_stats()
+            results['scheme_memo'][name] = {
+                counter: memo[counter] - memo_start[counter]
+                for counter in ('hits', 'misses', 'evictions')}
+            results['accuracy'][name] = accuracy(labels[name], truths)
+
+        _, latencies = time_each(
+            lambda pair: labeler._combine_schemes(*pair),
+            list(zip(labels['scheme'], labels['group'])))
+        stages['combine_schemes'] = summarize(latencies)
+
+        stats = SequenceStats('synthetic', DataLoader(path), labeler,
+                              incremental=False)
+        stats._label_rhymes()
+        _, graph_seconds = time_once(stats._construct_graph)
+        stages['construct_graph'] = summarize([graph_seconds], options.poems)
+    finally:
+        shutil.rmtree(dir)
+    return results
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--poems", type="int", default=1000,
+                      help="Number of synthetic poems.")
+    parser.add_option("--classes", type="int", default=500,
+                      help="Number of rhyme classes in the vocabulary.")
+    parser.add_option("--seed", type="int", default=0)
+    parser.add_option("--scheme", action="append", dest="schemes",
+                      choices=list(SCHEMES),
+                      help="Rhyme scheme to draw poems from; repeat for "
+                           "several. Defaults to all of them.")
+    parser.add_option("--packed", action="store_true", default=False,
+                      help="Store the corpus as a packed corpus file "
+                           "instead of a directory.")
+    parser.add_option("--output",
+                      help="File to write the JSON results to, instead "
+                           "of standard output.")
+    parser.add_option("--check", action="store_true", default=False,
+                      help="Fail unless group labeling finds every true "
+                           "rhyme group.")
+    (options, args) = parser.parse_args()
+
+    results = run(options)
+    report = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+    if options.check and results['accuracy']['group']['exact'] != 1:
+        sys.exit('group labeling missed true rhyme groups: %s'
+                 % results['accuracy']['group'])
+
+if __name__ == "__main__":
+    main()
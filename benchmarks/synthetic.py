@@ -0,0 +1,118 @@
+'''
+Synthetic sonnet corpora with known rhyme schemes, and the offline
+rhyme dictionary they are written against.
+
+Every word belongs to one rhyme class and rhymes with exactly the
+other words of its class. Each poem follows one of SCHEMES, with a
+different class for every letter and distinct words within a
+letter, so its true rhyme groups are known and are what group
+labeling should find.
+'''
+
+import os
+import random
+import sys
+
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from proto.Poem_pb2 import Poem
+
+SCHEMES = OrderedDict([
+    ('shakespearean', 'ABABCDCDEFEFGG'),
+    ('spenserian', 'ABABBCBCCDCDEE'),
+    ('petrarchan', 'ABBAABBACDECDE'),
+    ('petrarchan_cdcdcd', 'ABBAABBACDCDCD'),
+    ('couplets', 'AABBCCDDEEFFGG'),
+])
+
+def _spell(number, width):
+    '''
+    :return: a number written in lowercase letters, so that words
+    survive end word normalization.
+    '''
+    letters = []
+    for _ in range(width):
+        number, digit = divmod(number, 26)
+        letters.append(chr(ord('a') + digit))
+    return ''.join(reversed(letters))
+
+def make_rhyme_classes(num_classes=500, words_per_class=8):
+    '''
+    Make the vocabulary of rhyme classes.
+    :param num_classes: the number of rhyme classes.
+    :param words_per_class: the number of words in each class; at
+    least the number of lines of a letter in any scheme.
+    :return: the list of words of each class.
+    '''
+    return [['%s%s' % (_spell(c, 3), _spell(k, 2))
+             for k in range(words_per_class)]
+            for c in range(num_classes)]
+
+def make_rhyme_dict(classes):
+    '''
+    Make the rhyme dictionary of a vocabulary, as a RhymeLabeler
+    rhyme_dict: every word maps to the other words of its class.
+    :param classes: the classes of make_rhyme_classes.
+    :return: the rhyme dictionary.
+    '''
+    return {word: [other for other in words if other != word]
+            for words in classes for word in words}
+
+def scheme_groups(pattern):
+    '''
+    Get the rhyme groups of a scheme.
+    :param pattern: a scheme such as "ABABCDCDEFEFGG".
+    :return: the sorted groups of line indices, as
+    RhymeLabeler.get_rhyme_scheme returns them.
+    '''
+    groups = OrderedDict()
+    for i, letter in enumerate(pattern):
+        groups.setdefault(letter, []).append(i)
+    return sorted(groups.values(), key=lambda group: group[0])
+
+def make_poem(title, pattern, classes, rand):
+    '''
+    Make one poem following a scheme.
+    :param title: the title of the poem.
+    :param pattern: the scheme, see scheme_groups.
+    :param classes: the classes of make_rhyme_classes.
+    :param rand: the random.Random to draw words with.
+    :return: the Poem proto.
+    '''
+    letters = sorted(set(pattern))
+    chosen = rand.sample(range(len(classes)), len(letters))
+    words = {letter: rand.sample(classes[c], pattern.count(letter))
+             for letter, c in zip(letters, chosen)}
+    poem = Poem()
+    poem.title = title
+    for i, letter in enumerate(pattern):
+        word = words[letter].pop()
+        line = poem.entity.add().line
+        line.text = 'synthetic line %s ends with %s' % (_spell(i, 1), word)
+        line.index = i
+        line.end_word = word
+    return poem
+
+def make_corpus(num_poems, classes, seed=0, schemes=None):
+    '''
+    Make a corpus of poems with known rhyme schemes.
+    :param num_poems: the number of poems.
+    :param classes: the classes of make_rhyme_classes.
+    :param seed: the random seed; the same seed makes the same corpus.
+    :param schemes: the names of the SCHEMES to draw from, all by
+    default.
+    :return: the list of Poem protos and the list of their true
+    rhyme groups.
+    '''
+    rand = random.Random(seed)
+    names = list(schemes or SCHEMES)
+    poems, truths = [], []
+    for i in range(num_poems):
+        name = rand.choice(names)
+        poem = make_poem('synthetic_%07d' % i, SCHEMES[name], classes, rand)
+        poem.author = name
+        poems.append(poem)
+        truths.append(scheme_groups(SCHEMES[name]))
+    return poems, truths
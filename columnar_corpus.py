@@ -0,0 +1,180 @@
+'''
+Columnar export of a labeled corpus as NumPy arrays.
+
+A corpus is flattened into three tables, each column stored as its own
+.npy file in a directory so it can be memory-mapped back:
+    poems       title, author, first line, line count
+    lines       poem id, index in the poem, end word id
+    rhyme sets  poem id, offsets into set_lines, global line ids
+End words (and authors) are dictionary-encoded against a vocabulary.
+Aggregates such as group sizes, rhyme pair frequencies and the graph
+of shared rhyme pairs are then computed with array operations instead
+of walking Poem protos.
+'''
+
+import json
+import os
+
+import numpy as np
+
+from rhyme_labeler import get_end_words
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+COLUMNS = ['vocab', 'authors',
+           'poem_title', 'poem_author', 'poem_line_start', 'poem_line_count',
+           'line_poem', 'line_index', 'line_end_word',
+           'set_poem', 'set_offsets', 'set_lines']
+
+def _encode(values, vocab):
+    return [vocab.setdefault(value, len(vocab)) for value in values]
+
+def _strings(values):
+    # Fixed-width unicode arrays can be memory-mapped, unlike objects.
+    return np.array(values, dtype=str) if values else np.zeros(0, dtype='U1')
+
+def export_columnar(poems, dir):
+    '''
+    Write a corpus as columnar arrays.
+    :param poems: an iterable of Poem protos, e.g. the iter_poems()
+    of a DataLoader.
+    :param dir: the directory to write; created if missing.
+    '''
+    vocab = {}
+    authors = {}
+    columns = {name: [] for name in COLUMNS}
+    columns['set_offsets'].append(0)
+    for poem_id, poem in enumerate(poems):
+        words = get_end_words(poem)
+        line_start = len(columns['line_poem'])
+        columns['poem_title'].append(poem.title)
+        columns['poem_author'].append(_encode([poem.author], authors)[0])
+        columns['poem_line_start'].append(line_start)
+        columns['poem_line_count'].append(len(words))
+        columns['line_poem'].extend([poem_id] * len(words))
+        columns['line_index'].extend(entity.line.index
+                                     for entity in poem.entity)
+        columns['line_end_word'].extend(_encode(words, vocab))
+        for rhyme_set in poem.rhyme_sets:
+            columns['set_poem'].append(poem_id)
+            columns['set_lines'].extend(line_start + i
+                                        for i in rhyme_set.rhyme_indices)
+            columns['set_offsets'].append(len(columns['set_lines']))
+
+    os.makedirs(dir, exist_ok=True)
+    arrays = {'vocab': _strings(list(vocab)),
+              'authors': _strings(list(authors)),
+              'poem_title': _strings(columns['poem_title'])}
+    for name in ['poem_author', 'poem_line_count', 'line_poem',
+                 'line_index', 'line_end_word', 'set_poem']:
+        arrays[name] = np.array(columns[name], dtype=np.int32)
+    for name in ['poem_line_start', 'set_offsets', 'set_lines']:
+        arrays[name] = np.array(columns[name], dtype=np.int64)
+    for name, array in arrays.items():
+        np.save(os.path.join(dir, name + '.npy'), array)
+    with open(os.path.join(dir, META_FILE), 'w') as meta_file:
+        json.dump({'version': FORMAT_VERSION,
+                   'poems': len(columns['poem_title']),
+                   'lines': len(columns['line_poem']),
+                   'rhyme_sets': len(columns['set_poem'])}, meta_file)
+
+class ColumnarCorpus(object):
+    '''
+    Reader of a corpus written by export_columnar. Every column is
+    memory-mapped as an attribute of the same name.
+    '''
+
+    def __init__(self, dir):
+        '''
+        Constructor of a ColumnarCorpus.
+        :param dir: the directory written by export_columnar.
+        '''
+        with open(os.path.join(dir, META_FILE), 'r') as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta['version'] != FORMAT_VERSION:
+            raise ValueError('Unsupported columnar corpus version %d.'
+                             % self.meta['version'])
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(dir, name + '.npy'),
+                                        mmap_mode='r'))
+
+    def group_sizes(self):
+        '''
+        :return: the number of lines of every rhyme set.
+        '''
+        return np.diff(self.set_offsets)
+
+    def group_size_stats(self):
+        '''
+        :return: the average, largest and sample standard deviation
+        of the rhyme group sizes, as corpus_stats reports them.
+        '''
+        sizes = self.group_sizes()
+        return {'groups': len(sizes),
+                'average': float(sizes.mean()) if len(sizes) else None,
+                'largest': int(sizes.max()) if len(sizes) else None,
+                'stdev': float(sizes.std(ddof=1)) if len(sizes) > 1 else None}
+
+    def rhyme_pair_lines(self):
+        '''
+        Get every pair of lines in the same rhyme set.
+        :return: the global ids of the first and second lines of
+        each pair, as two arrays.
+        '''
+        set_ids = np.repeat(np.arange(len(self.set_poem)), self.group_sizes())
+        lines = np.asarray(self.set_lines)
+        first, second = [], []
+        # Pair every line with the one k places after it in its set.
+        for k in range(1, int(self.group_sizes().max(initial=0))):
+            same_set = set_ids[:-k] == set_ids[k:]
+            first.append(lines[:-k][same_set])
+            second.append(lines[k:][same_set])
+        if not first:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(first), np.concatenate(second)
+
+    def _pair_codes(self):
+        '''
+        :return: the code of the sorted end word pair of every pair
+        of rhyming lines, and the poem of each.
+        '''
+        first, second = self.rhyme_pair_lines()
+        words = np.asarray(self.line_end_word, dtype=np.int64)
+        a, b = words[first], words[second]
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        return low * len(self.vocab) + high, np.asarray(self.line_poem)[first]
+
+    def rhyme_pair_counts(self):
+        '''
+        Count how often every pair of end words rhymes in the corpus.
+        :return: a list of ((word, word), count) pairs, each pair
+        sorted as rhyme_graph.rhyme_pairs sorts them, most frequent
+        first.
+        '''
+        codes, poems = self._pair_codes()
+        codes, counts = np.unique(codes, return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        return [(tuple(sorted((str(self.vocab[code // len(self.vocab)]),
+                               str(self.vocab[code % len(self.vocab)])))),
+                 int(count))
+                for code, count in zip(codes[order], counts[order])]
+
+    def rhyme_graph(self, min_weight=1, top_k=None):
+        '''
+        Build the graph of poems sharing rhyme pairs, as
+        RhymeGraph.from_poems does.
+        :param min_weight: see RhymeGraph.from_poems.
+        :param top_k: see RhymeGraph.from_poems.
+        :return: the RhymeGraph.
+        '''
+        from rhyme_graph import RhymeGraph
+
+        codes, poems = self._pair_codes()
+        # Distinct (pair, poem) postings, grouped by pair.
+        postings = np.unique(np.stack([codes, poems.astype(np.int64)]),
+                             axis=1)
+        boundaries = np.flatnonzero(np.diff(postings[0])) + 1
+        return RhymeGraph.from_pair_index(
+            [str(title) for title in self.poem_title],
+            np.split(postings[1], boundaries) if postings.shape[1] else [],
+            min_weight, top_k)
@@ -0,0 +1,214 @@
+'''
+Streaming statistics over labeled sonnet sequences.
+
+Poems are streamed from each sequence with DataLoader.iter_poems and
+labeled one at a time, or in batches spread over one pool of worker
+processes shared by every sequence, and group sizes are folded into
+single-pass accumulators, so memory does not grow with the size of a
+sequence. Sequences are summarized in a JSON-serializable report.
+'''
+
+import itertools
+import json
+import math
+
+from collections import OrderedDict, deque
+from functools import partial
+
+from data_loader import DataLoader
+from metrics import NULL_METRICS
+
+# Poems sent to a worker process at a time.
+DEFAULT_BATCH_SIZE = 256
+# Batches waiting or being labeled per worker process.
+BATCHES_PER_WORKER = 2
+
+class GroupSizeStats(object):
+    '''
+    Single-pass accumulator of rhyme group sizes: count, mean and
+    variance (Welford's algorithm), maximum and histogram.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.max = None
+        self.histogram = {}
+        self._m2 = 0.0
+
+    def add(self, size):
+        '''
+        Add the size of one rhyme group.
+        :param size: the number of lines in the group.
+        '''
+        self.count += 1
+        delta = size - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (size - self.mean)
+        self.max = size if self.max is None else max(self.max, size)
+        self.histogram[size] = self.histogram.get(size, 0) + 1
+
+    def add_scheme(self, rhyme_scheme):
+        '''
+        Add the sizes of every group of a rhyme scheme.
+        :param rhyme_scheme: a rhyme scheme, as returned by
+        RhymeLabeler.get_rhyme_scheme.
+        '''
+        for group in rhyme_scheme:
+            self.add(len(group))
+
+    def merge(self, other):
+        '''
+        Combine the statistics of another accumulator into this one.
+        :param other: a GroupSizeStats.
+        '''
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        for size, size_count in other.histogram.items():
+            self.histogram[size] = self.histogram.get(size, 0) + size_count
+
+    def stdev(self):
+        '''
+        :return: the sample standard deviation, as statistics.stdev
+        computes it, or None with fewer than two groups.
+        '''
+        if self.count < 2:
+            return None
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def to_dict(self):
+        '''
+        :return: the statistics as a JSON-serializable dictionary.
+        '''
+        return {'groups': self.count,
+                'average': self.mean if self.count else None,
+                'largest': self.max,
+                'stdev': self.stdev(),
+                'histogram': {str(size): self.histogram[size]
+                              for size in sorted(self.histogram)}}
+
+def sequence_group_sizes(data, rhyme_labeler, scheme=True, group=True,
+                         progress=None):
+    '''
+    Get the rhyme group size statistics of one sequence, labeling
+    its poems one at a time in this process.
+    :param data: the DataLoader of the sequence.
+    :param rhyme_labeler: the RhymeLabeler to label poems with.
+    :param scheme: see RhymeLabeler.get_rhyme_scheme.
+    :param group: see RhymeLabeler.get_rhyme_scheme.
+    :param progress: if set, called with the number of poems labeled
+    so far and the total after every poem.
+    :return: a GroupSizeStats.
+    '''
+    stats = GroupSizeStats()
+    total = len(data.poems)
+    for i, poem in enumerate(data.iter_poems()):
+        stats.add_scheme(rhyme_labeler.get_rhyme_scheme(poem, scheme, group))
+        if progress is not None:
+            progress(i + 1, total)
+    return stats
+
+def _batches(poems, size):
+    '''
+    Split an iterable of poems into lists of at most size poems.
+    '''
+    poems = iter(poems)
+    while True:
+        batch = list(itertools.islice(poems, size))
+        if not batch:
+            return
+        yield batch
+
+def corpus_report(sequences, rhyme_labeler, scheme=True, group=True,
+                  workers=1, prefetch=None, progress=None,
+                  metrics=NULL_METRICS, batch_size=DEFAULT_BATCH_SIZE):
+    '''
+    Get the rhyme group size statistics of several sequences.
+    :param sequences: a mapping from sequence names to their
+    directories (or packed corpus files), or a list of paths used
+    as names.
+    :param rhyme_labeler: the RhymeLabeler to label poems with.
+    :param scheme: see RhymeLabeler.get_rhyme_scheme.
+    :param group: see RhymeLabeler.get_rhyme_scheme.
+    :param workers: the number of processes to label with. With more
+    than one, batches of poems of every sequence are labeled in one
+    pool (see RhymeLabeler.label_pool), so sequences are labeled in
+    parallel, and the next sequence is prefetched meanwhile.
+    :param prefetch: if set, options of RhymeLabeler.prefetch_rhymes
+    used to look up each sequence's rhymes before labeling it.
+    :param progress: if set, called with the sequence name, the number
+    of poems labeled so far and the total after every poem, or every
+    batch with several workers. Sequences report in order.
+    :param metrics: a metrics.Metrics for the DataLoader of each
+    sequence.
+    :param batch_size: the number of poems sent to a worker at a time.
+    :return: a dictionary with the statistics of each sequence,
+    by name, under "sequences" and of all of them under "corpus".
+    '''
+    if not isinstance(sequences, dict):
+        sequences = OrderedDict((path, path) for path in sequences)
+
+    def loaders():
+        for name, path in sequences.items():
+            data = DataLoader(path, metrics=metrics)
+            if prefetch is not None:
+                rhyme_labeler.prefetch_rhymes(data.iter_poems(), **prefetch)
+            yield name, data
+
+    results = OrderedDict((name, GroupSizeStats()) for name in sequences)
+    if workers == 1:
+        for name, data in loaders():
+            sequence_progress = None
+            if progress is not None:
+                sequence_progress = partial(progress, name)
+            results[name] = sequence_group_sizes(data, rhyme_labeler, scheme,
+                                                 group, sequence_progress)
+    else:
+        totals = {}
+        done = dict.fromkeys(sequences, 0)
+        pending = deque()
+
+        def collect():
+            name, size, future = pending.popleft()
+            for rhyme_scheme in future.result():
+                results[name].add_scheme(rhyme_scheme)
+            done[name] += size
+            if progress is not None:
+                progress(name, done[name], totals[name])
+
+        with rhyme_labeler.label_pool(workers) as executor:
+            for name, data in loaders():
+                totals[name] = len(data.poems)
+                for batch in _batches(data.iter_poems(), batch_size):
+                    pending.append((name, len(batch),
+                                    rhyme_labeler.submit_labels(
+                                        executor, batch, scheme, group)))
+                    # Bound the poems in flight, so that memory stays
+                    # constant.
+                    while len(pending) > BATCHES_PER_WORKER * workers:
+                        collect()
+            while pending:
+                collect()
+
+    report = OrderedDict()
+    corpus = GroupSizeStats()
+    for name, stats in results.items():
+        report[name] = stats.to_dict()
+        corpus.merge(stats)
+    return {'sequences': report, 'corpus': corpus.to_dict()}
+
+def write_report(report, filename):
+    '''
+    Save a report of corpus_report as JSON.
+    :param report: the report.
+    :param filename: the file to write.
+    '''
+    with open(filename, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+        report_file.write('\n')
@@ -1,31 +1,336 @@
+import hashlib
 import sys
 import os
+from collections import OrderedDict, namedtuple
+from collections.abc import MutableMapping
+from metrics import NULL_METRICS
+from packed_corpus import PackedCorpus, is_packed_corpus, write_packed_records
 from proto.Poem_pb2 import *
 
+POEM_EXTENSION = ".txt"
+TMP_EXTENSION = ".tmp"
+
+'''
+Index entry for the file of one poem.
+'''
+PoemFile = namedtuple('PoemFile', ['path', 'size', 'mtime'])
+
+'''
+Get a short content hash of a serialized poem.
+'''
+def _content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+'''
+Mapping from titles to the Poem objects of a DataLoader, parsing each
+poem the first time it is accessed. With a cache size, only that many
+parsed poems are kept, least recently used first out; evicted poems
+that were modified, and poems added to the mapping, are held until the
+next DataLoader.write and then count against the cache size again. A
+poem modified after it was evicted is not tracked any more: modify
+poems in lists of at most the cache size, see DataLoader.iter_chunks.
+'''
+class LazyPoems(MutableMapping):
+
+    def __init__(self, loader, cache_size=None):
+        self._loader = loader
+        self._cache_size = cache_size
+        self._parsed = OrderedDict()
+        self._added = {}
+        # Content hash of each parsed poem as last read or written.
+        self._hashes = {}
+        self._marked = set()
+
+    def __getitem__(self, title):
+        if title in self._added:
+            return self._added[title]
+        if title in self._parsed:
+            self._parsed.move_to_end(title)
+            return self._parsed[title]
+        if title not in self._loader.index:
+            raise KeyError(title)
+        data = self._loader._read_bytes(title)
+        poem = self._loader._parse(data)
+        self._parsed[title] = poem
+        self._hashes[title] = _content_hash(data)
+        self._trim()
+        return poem
+
+    '''
+    Evict parsed poems until at most the cache size are kept.
+    '''
+    def _trim(self):
+        if self._cache_size is not None:
+            while len(self._parsed) > self._cache_size:
+                self._evict()
+
+    '''
+    Drop the least recently used parsed poem, keeping it as an added
+    poem if it was modified.
+    '''
+    def _evict(self):
+        title, poem = self._parsed.popitem(last=False)
+        if self._is_dirty(title, poem):
+            self._added[title] = poem
+        else:
+            del self._hashes[title]
+
+    def __setitem__(self, title, poem):
+        self._parsed.pop(title, None)
+        self._added[title] = poem
+
+    def __delitem__(self, title):
+        if title not in self:
+            raise KeyError(title)
+        self._added.pop(title, None)
+        self._parsed.pop(title, None)
+        self._hashes.pop(title, None)
+        self._marked.discard(title)
+        self._loader.index.pop(title, None)
+
+    def __contains__(self, title):
+        return title in self._added or title in self._loader.index
+
+    def __iter__(self):
+        for title in self._loader.index:
+            if title not in self._added:
+                yield title
+        for title in self._added:
+            yield title
+
+    def __len__(self):
+        return len(self._loader.index) + sum(
+            1 for title in self._added if title not in self._loader.index)
+
+    '''
+    Get the poems parsed or added so far, without parsing any others.
+    '''
+    def loaded(self):
+        poems = dict(self._parsed)
+        poems.update(self._added)
+        return poems
+
+    '''
+    Get a poem only if it was already parsed or added, or None.
+    '''
+    def cached(self, title):
+        if title in self._added:
+            return self._added[title]
+        return self._parsed.get(title)
+
+    '''
+    Check whether a loaded poem differs from its stored version.
+    '''
+    def _is_dirty(self, title, poem):
+        if title in self._marked or title not in self._hashes:
+            return True
+        return _content_hash(poem.SerializeToString()) != self._hashes[title]
+
+    '''
+    Get the titles of the poems that were added, marked, or whose
+    content changed since they were read or last written.
+    '''
+    def dirty(self):
+        return [title for title, poem in self.loaded().items()
+                if self._is_dirty(title, poem)]
+
+    '''
+    Force a poem to be written by the next DataLoader.write.
+    '''
+    def mark_dirty(self, title):
+        if self.cached(title) is None:
+            self[title]
+        self._marked.add(title)
+
+    '''
+    Record that poems were written with the given serialized content.
+    Written poems held outside the cache go back into it, first in line
+    for eviction.
+    ::param:: written an iterable of titles and serialized poems.
+    '''
+    def _mark_clean(self, written):
+        for title, data in written:
+            self._marked.discard(title)
+            self._hashes[title] = _content_hash(data)
+            if title in self._added and title in self._loader.index:
+                self._parsed[title] = self._added.pop(title)
+                self._parsed.move_to_end(title, last=False)
+        self._trim()
+
 '''
 Load Data on Poem objects for a particular sequence.
 '''
 class DataLoader(object):
 
     '''
-    Load data from poems into memory.
+    Index the poems of a sequence. Poems are only read and parsed
+    when accessed through `poems` or `iter_poems`.
+    ::param:: dir the directory of the sequence's poem files, or a
+    packed corpus file (see packed_corpus), which is memory-mapped.
+    ::param:: cache_size the maximum number of parsed poems to keep
+    in memory, or None to keep every poem once parsed.
+    ::param:: metrics a metrics.Metrics recording the poems and bytes
+    read and written and the time spent parsing and writing.
     '''
-    def __init__(self, dir):
-        self.poems = {}
+    def __init__(self, dir, cache_size=None, metrics=NULL_METRICS):
         self._dir = dir
-        for filename in os.listdir(dir):
-            if filename.endswith(".txt"):
-                path = dir + filename
-                with open(path, 'rb') as file:
-                    poem = Poem()
-                    poem.ParseFromString(file.read())
-                    self.poems[poem.title] = poem
-
-    '''
-    Write all updated poems to memory.
-    '''
-    def write(self):
-        for poem in self.poems.values():
-            path = self._dir + poem.title + ".txt"
-            with open(path, 'wb') as file:
-                file.write(poem.SerializeToString())
+        self._packed = None
+        self.metrics = metrics
+        self.index = OrderedDict()
+        if is_packed_corpus(dir):
+            self._packed = PackedCorpus(dir)
+            self.index = self._packed.index
+        else:
+            with os.scandir(dir) as entries:
+                for entry in entries:
+                    if (entry.name.endswith(POEM_EXTENSION)
+                            and entry.is_file()):
+                        stat = entry.stat()
+                        title = entry.name[:-len(POEM_EXTENSION)]
+                        self.index[title] = PoemFile(entry.path,
+                                                     stat.st_size,
+                                                     stat.st_mtime)
+        self.poems = LazyPoems(self, cache_size)
+
+    '''
+    Read the serialized poem with a title.
+    '''
+    def _read_bytes(self, title):
+        if self._packed is not None:
+            data = self._packed.read_record(title)
+        else:
+            with open(self.index[title].path, 'rb') as file:
+                data = file.read()
+        self.metrics.count('loader.poems_read')
+        self.metrics.count('loader.bytes_read', len(data))
+        return data
+
+    '''
+    Parse a serialized poem.
+    '''
+    def _parse(self, data):
+        with self.metrics.timer('loader.parse'):
+            poem = Poem()
+            poem.ParseFromString(data)
+        return poem
+
+    '''
+    Read and parse the poem with a title.
+    '''
+    def _read(self, title):
+        return self._parse(self._read_bytes(title))
+
+    '''
+    Iterate over every poem, parsing poems that are not in memory
+    one at a time without keeping them. Packed corpora are read
+    sequentially in file order.
+    '''
+    def iter_poems(self):
+        if self._packed is not None:
+            self._packed.advise_sequential()
+        for title in self.poems:
+            poem = self.poems.cached(title)
+            yield poem if poem is not None else self._read(title)
+
+    '''
+    Iterate over every poem in lists that fit in the cache, so that
+    the poems of a list can be modified before any of them is
+    evicted, and are then kept until the next write.
+    ::param:: size the largest number of poems per list. Defaults
+    to the cache size, or to every poem without one.
+    '''
+    def iter_chunks(self, size=None):
+        cache_size = self.poems._cache_size
+        if cache_size is not None:
+            size = cache_size if size is None else min(size, cache_size)
+        titles = list(self.poems)
+        if size is None:
+            size = len(titles)
+        for start in range(0, len(titles), max(size, 1)):
+            yield [self.poems[title] for title in titles[start:start + size]]
+
+    '''
+    Write the poems that were modified since they were read or last
+    written (see mark_dirty). Each poem is written to a temporary file
+    and renamed over the original, so an interrupted write never
+    leaves a truncated poem behind. A packed corpus is rewritten as a
+    whole the same way, copying unmodified records as is.
+    ::param:: fsync if True, flush the written files to disk: all of
+    them are synced once before any is renamed into place, then the
+    directory is synced.
+    ::return:: the titles of the poems written.
+    '''
+    def write(self, fsync=False):
+        with self.metrics.timer('loader.write'):
+            return self._write(fsync)
+
+    def _write(self, fsync):
+        dirty = self.poems.dirty()
+        if not dirty:
+            return []
+        if self._packed is not None:
+            self._write_packed(fsync)
+            return dirty
+
+        written = []
+        for title in dirty:
+            poem = self.poems.cached(title)
+            data = poem.SerializeToString()
+            path = os.path.join(self._dir, poem.title + POEM_EXTENSION)
+            with open(path + TMP_EXTENSION, 'wb') as file:
+                file.write(data)
+            if not fsync:
+                os.replace(path + TMP_EXTENSION, path)
+            written.append((title, path, data))
+            self.metrics.count('loader.poems_written')
+            self.metrics.count('loader.bytes_written', len(data))
+        if fsync:
+            for title, path, data in written:
+                _fsync_path(path + TMP_EXTENSION)
+            for title, path, data in written:
+                os.replace(path + TMP_EXTENSION, path)
+            _fsync_path(self._dir)
+        for title, path, data in written:
+            self.index[title] = PoemFile(path, len(data),
+                                         os.path.getmtime(path))
+        self.poems._mark_clean((title, data) for title, path, data in written)
+        return dirty
+
+    '''
+    Mark a poem as modified, for changes write() cannot detect.
+    '''
+    def mark_dirty(self, title):
+        self.poems.mark_dirty(title)
+
+    '''
+    Rewrite a packed corpus and map the new file.
+    '''
+    def _write_packed(self, fsync):
+        clean = {}
+        def records():
+            for title in self.poems:
+                poem = self.poems.cached(title)
+                if poem is not None:
+                    data = poem.SerializeToString()
+                    clean[title] = data
+                else:
+                    data = self._read_bytes(title)
+                self.metrics.count('loader.poems_written')
+                self.metrics.count('loader.bytes_written', len(data))
+                yield title, data
+
+        write_packed_records(records(), self._dir, fsync)
+        self._packed.close()
+        self._packed = PackedCorpus(self._dir)
+        self.index = self._packed.index
+        self.poems._mark_clean(clean.items())
+
+'''
+Flush a file or directory to disk.
+'''
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,44 @@
+'''
+Rhyme lookup through the Datamuse API. Use the `add_rhymes` method of
+a `DatamuseRhymes` object as the `add_rhymes` callback of a
+RhymeLabeler:
+
+    rhymes = DatamuseRhymes()
+    rhyme_labeler = RhymeLabeler(rhymes.add_rhymes, RhymeCache(filename))
+
+The datamuse package is only imported when a DatamuseRhymes is created.
+'''
+
+from metrics import NULL_METRICS
+
+DATAMUSE_MAX = 100
+
+class DatamuseRhymes(object):
+    '''
+    Datamuse client adding the rhymes of words to rhyme dictionaries.
+    '''
+
+    def __init__(self, max_results=DATAMUSE_MAX, metrics=NULL_METRICS):
+        '''
+        Constructor of a DatamuseRhymes.
+        :param max_results: the most rhymes to keep per word.
+        :param metrics: a metrics.Metrics timing every API call
+        under "datamuse".
+        '''
+        from datamuse import datamuse
+
+        self.api = datamuse.Datamuse()
+        self.max_results = max_results
+        self.metrics = metrics
+
+    def add_rhymes(self, words, rhyme_dict):
+        '''
+        Add the rhymes of words missing from a rhyme dictionary.
+        :param words: the words to look up.
+        :param rhyme_dict: the rhyme dictionary to add them to.
+        '''
+        for word in words:
+            if word not in rhyme_dict:
+                with self.metrics.timer('datamuse'):
+                    rhyme_dict[word] = [d['word'] for d in self.api.words(
+                        rel_rhy=word, max=self.max_results)]
@@ -0,0 +1,84 @@
+'''
+Array-backed disjoint-set (union-find) over the integers 0..n-1,
+used to merge rhyming lines into groups.
+'''
+
+class DisjointSet(object):
+    '''
+    Disjoint sets of integers with union by size and path halving.
+    Only the elements passed to union are members of a set; the
+    others are ignored by groups().
+    '''
+
+    def __init__(self, size):
+        '''
+        Constructor of a DisjointSet.
+        :param size: the number of elements; elements are the
+        integers from 0 to size - 1.
+        '''
+        self._parent = list(range(size))
+        self._size = [1] * size
+        self._members = [False] * size
+
+    def add(self, i):
+        '''
+        Make an element a member on its own.
+        :param i: the element.
+        '''
+        self._members[i] = True
+
+    def find(self, i):
+        '''
+        Get the representative of the set of an element.
+        :param i: the element.
+        :return: the representative element.
+        '''
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        '''
+        Merge the sets of two elements, making both members.
+        :param i: the first element.
+        :param j: the second element.
+        '''
+        self._members[i] = self._members[j] = True
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return
+        if self._size[i] < self._size[j]:
+            i, j = j, i
+        self._parent[j] = i
+        self._size[i] += self._size[j]
+
+    def groups(self):
+        '''
+        Get the sets of all members.
+        :return: a list of sets as sorted lists, ordered by their
+        smallest element.
+        '''
+        groups = {}
+        for i, member in enumerate(self._members):
+            if member:
+                groups.setdefault(self.find(i), []).append(i)
+        return list(groups.values())
+
+    def to_networkx(self):
+        '''
+        Export the sets as a networkx graph whose connected
+        components are the sets. Requires networkx.
+        :return: a networkx Graph linking every member to the
+        representative of its set.
+        '''
+        import networkx as nx
+
+        G = nx.Graph()
+        for i, member in enumerate(self._members):
+            if member:
+                G.add_node(i)
+                if self.find(i) != i:
+                    G.add_edge(i, self.find(i))
+        return G
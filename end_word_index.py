@@ -0,0 +1,299 @@
+'''
+Persistent inverted index of the end words and labeled rhyme pairs of
+any number of sequences, backed by sqlite.
+
+For every indexed poem, the index keeps the end word of each line
+(end word -> sequence, title, line index) and the pairs of end words
+its rhyme_sets rhyme together (rhyme pair -> poems), so rhyme queries
+and the rhyme graph need no Poem to be parsed:
+
+    index = EndWordIndex('data/index.sqlite')
+    index.index_corpus('Shakespeare', DataLoader('data/shakespeare_sonnets/'))
+    index.poems_rhyming('love', 'prove')
+
+Poems are reindexed only when their end words or labels change, so
+indexing a corpus again after relabeling it is incremental.
+'''
+
+import hashlib
+import sqlite3
+import threading
+
+from rhyme_graph import RhymeGraph, rhyme_pairs
+from rhyme_labeler import get_end_words
+
+DEFAULT_TIMEOUT = 30.0
+
+class EndWordIndex(object):
+    '''
+    Index of end words and rhyme pairs stored in a sqlite file. Safe
+    to share between threads, and between processes opening the same
+    file.
+    '''
+
+    def __init__(self, filename, timeout=DEFAULT_TIMEOUT):
+        '''
+        Constructor of an EndWordIndex.
+        :param filename: the sqlite file of the index. It is
+        created if it does not exist.
+        :param timeout: seconds to wait for another process holding
+        a lock on the file.
+        '''
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(filename, timeout=timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS poems (
+                id INTEGER PRIMARY KEY,
+                sequence TEXT NOT NULL,
+                title TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                UNIQUE (sequence, title));
+            CREATE TABLE IF NOT EXISTS lines (
+                poem_id INTEGER NOT NULL,
+                line_index INTEGER NOT NULL,
+                end_word TEXT NOT NULL,
+                PRIMARY KEY (poem_id, line_index));
+            CREATE INDEX IF NOT EXISTS lines_by_end_word
+                ON lines (end_word);
+            CREATE TABLE IF NOT EXISTS pairs (
+                word TEXT NOT NULL,
+                other_word TEXT NOT NULL,
+                poem_id INTEGER NOT NULL,
+                PRIMARY KEY (word, other_word, poem_id));
+            CREATE INDEX IF NOT EXISTS pairs_by_other_word
+                ON pairs (other_word);
+            CREATE INDEX IF NOT EXISTS pairs_by_poem ON pairs (poem_id);
+        ''')
+
+    # ----------------------- UPDATE ------------------------
+
+    def _delete(self, poem_id):
+        self._db.execute('DELETE FROM lines WHERE poem_id = ?', (poem_id,))
+        self._db.execute('DELETE FROM pairs WHERE poem_id = ?', (poem_id,))
+        self._db.execute('DELETE FROM poems WHERE id = ?', (poem_id,))
+
+    def _update_poem(self, sequence, poem):
+        words = get_end_words(poem)
+        pairs = sorted(rhyme_pairs(poem))
+        digest = hashlib.blake2b(repr((words, pairs)).encode('utf-8'),
+                                 digest_size=16).digest()
+        row = self._db.execute(
+            'SELECT id, digest FROM poems WHERE sequence = ? AND title = ?',
+            (sequence, poem.title)).fetchone()
+        if row is None:
+            poem_id = self._db.execute(
+                'INSERT INTO poems (sequence, title, digest) VALUES (?, ?, ?)',
+                (sequence, poem.title, digest)).lastrowid
+        elif row[1] == digest:
+            return False
+        else:
+            # Keep the id, and so the order, of a reindexed poem.
+            poem_id = row[0]
+            self._db.execute('DELETE FROM lines WHERE poem_id = ?', (poem_id,))
+            self._db.execute('DELETE FROM pairs WHERE poem_id = ?', (poem_id,))
+            self._db.execute('UPDATE poems SET digest = ? WHERE id = ?',
+                             (digest, poem_id))
+        self._db.executemany(
+            'INSERT INTO lines VALUES (?, ?, ?)',
+            [(poem_id, i, word) for i, word in enumerate(words)])
+        self._db.executemany(
+            'INSERT INTO pairs VALUES (?, ?, ?)',
+            [(word, other_word, poem_id) for word, other_word in pairs])
+        return True
+
+    def update_poem(self, sequence, poem):
+        '''
+        Index a poem, replacing its previous entries.
+        :param sequence: the name of the poem's sequence.
+        :param poem: the Poem proto, with its rhyme_sets.
+        :return: True if the poem was reindexed, False if its end
+        words and labels were already indexed.
+        '''
+        return self.update(sequence, [poem]) == 1
+
+    def update(self, sequence, poems):
+        '''
+        Index many poems of a sequence in one transaction.
+        :param sequence: the name of the sequence.
+        :param poems: an iterable of Poem protos.
+        :return: the number of poems reindexed.
+        '''
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                updated = sum(self._update_poem(sequence, poem)
+                              for poem in poems)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return updated
+
+    def remove_poem(self, sequence, title):
+        '''
+        Remove a poem from the index, if it is indexed.
+        '''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id FROM poems WHERE sequence = ? AND title = ?',
+                (sequence, title)).fetchone()
+            if row is not None:
+                self._db.execute('BEGIN IMMEDIATE')
+                self._delete(row[0])
+                self._db.execute('COMMIT')
+
+    def index_corpus(self, sequence, data):
+        '''
+        Bring the index of a sequence up to date with a corpus,
+        streaming its poems and removing those no longer in it.
+        :param sequence: the name of the sequence.
+        :param data: the DataLoader of the sequence.
+        :return: the number of poems reindexed.
+        '''
+        updated = self.update(sequence, data.iter_poems())
+        for title in set(self.titles(sequence)) - set(data.poems):
+            self.remove_poem(sequence, title)
+        return updated
+
+    # ----------------------- QUERY -------------------------
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def sequences(self):
+        '''
+        :return: the names of the indexed sequences.
+        '''
+        return [row[0] for row in self._query(
+            'SELECT DISTINCT sequence FROM poems ORDER BY sequence')]
+
+    def titles(self, sequence):
+        '''
+        :return: the titles of the indexed poems of a sequence, in
+        the order they were first indexed.
+        '''
+        return [row[0] for row in self._query(
+            'SELECT title FROM poems WHERE sequence = ? ORDER BY id',
+            (sequence,))]
+
+    def lines_ending_with(self, word):
+        '''
+        :param word: a normalized end word.
+        :return: the (sequence, title, line index) of every line
+        ending with the word.
+        '''
+        return self._query(
+            'SELECT sequence, title, line_index FROM lines '
+            'JOIN poems ON poems.id = lines.poem_id '
+            'WHERE end_word = ? ORDER BY poems.id, line_index', (word,))
+
+    def poems_rhyming(self, word, other_word):
+        '''
+        :return: the (sequence, title) of every poem whose labels
+        rhyme two words together.
+        '''
+        word, other_word = sorted((word, other_word))
+        return self._query(
+            'SELECT sequence, title FROM pairs '
+            'JOIN poems ON poems.id = pairs.poem_id '
+            'WHERE word = ? AND other_word = ? ORDER BY poems.id',
+            (word, other_word))
+
+    def rhymes_of(self, word):
+        '''
+        :return: the words the labels of the corpus rhyme with a
+        word, each with the number of poems doing so, most frequent
+        first. The word itself is listed if poems rhyme it with
+        itself, e.g. by repeating an end word.
+        '''
+        # A pair of the word with itself matches both sides of the
+        # union, so poems are counted once.
+        return self._query(
+            'SELECT other, COUNT(DISTINCT poem_id) AS poems FROM ('
+            'SELECT other_word AS other, poem_id FROM pairs WHERE word = ? '
+            'UNION ALL '
+            'SELECT word AS other, poem_id FROM pairs '
+            'WHERE other_word = ?) '
+            'GROUP BY other ORDER BY poems DESC, other', (word, word))
+
+    def lines_rhyming_with(self, word, rhyme_dict=None):
+        '''
+        Find every line ending with a word that rhymes with a word,
+        according to the labels of the corpus and, optionally, a
+        rhyme dictionary.
+        :param word: a normalized end word.
+        :param rhyme_dict: a rhyme dictionary, e.g. the rhyme_dict of
+        a RhymeLabeler, or None.
+        :return: the (sequence, title, line index, end word) of
+        every line.
+        '''
+        words = set(other for other, poems in self.rhymes_of(word))
+        if rhyme_dict is not None and word in rhyme_dict:
+            words.update(rhyme_dict[word])
+        words.discard(word)
+        lines = []
+        for other in sorted(words):
+            lines.extend(posting + (other,)
+                         for posting in self.lines_ending_with(other))
+        return lines
+
+    def pair_postings(self, sequences=None):
+        '''
+        Get the inverted index of rhyme pairs, for
+        RhymeGraph.from_pair_index.
+        :param sequences: the names of the sequences to include, or
+        None for all of them.
+        :return: the (sequence, title) of each poem id, and for each
+        rhyme pair the ids of the poems using it.
+        '''
+        if sequences is None:
+            sequences = self.sequences()
+        marks = ', '.join('?' * len(sequences))
+        poems = self._query('SELECT id, sequence, title FROM poems '
+                            'WHERE sequence IN (%s) ORDER BY id' % marks,
+                            sequences)
+        ids = {row[0]: i for i, row in enumerate(poems)}
+        postings = []
+        last_pair = None
+        for word, other_word, poem_id in self._query(
+                'SELECT word, other_word, poem_id FROM pairs '
+                'JOIN poems ON poems.id = pairs.poem_id '
+                'WHERE sequence IN (%s) '
+                'ORDER BY word, other_word, poem_id' % marks, sequences):
+            if (word, other_word) != last_pair:
+                postings.append([])
+                last_pair = (word, other_word)
+            postings[-1].append(ids[poem_id])
+        return [row[1:] for row in poems], postings
+
+    def rhyme_graph(self, sequences=None, min_weight=1, top_k=None):
+        '''
+        Build the graph of poems sharing rhyme pairs from the index,
+        as RhymeGraph.from_poems does from poems. Nodes are named by
+        title, prefixed with "sequence/" when several sequences are
+        included.
+        :param sequences: see pair_postings.
+        :param min_weight: see RhymeGraph.from_poems.
+        :param top_k: see RhymeGraph.from_poems.
+        :return: the RhymeGraph.
+        '''
+        poems, postings = self.pair_postings(sequences)
+        if len(set(sequence for sequence, title in poems)) > 1:
+            titles = ['%s/%s' % poem for poem in poems]
+        else:
+            titles = [title for sequence, title in poems]
+        return RhymeGraph.from_pair_index(titles, postings, min_weight,
+                                          top_k)
+
+    def close(self):
+        '''
+        Close the underlying database.
+        '''
+        with self._lock:
+            self._db.close()
@@ -9,14 +9,13 @@ from Google Drive.
 ::version:: 2.0
 '''
 
+import functools
 import optparse
 import os
 import sys
 
-from bs4 import BeautifulSoup
-from urllib.request import urlopen
 from util.dataset_utils import *
-from proto.Poem_pb2 import *
+from util.fetch_utils import *
 
 # Sidney constants.
 SIDNEY = "Philip Sidney"
@@ -40,36 +39,54 @@ SPENSER_DIR = "./data/spenser_amoretti/"
 # General constants.
 HTML = ".html"
 PARSER = "html.parser"
-
-def IngestShakespeareSonnets(verbose):
-    for i in range(1, NUM_SHAKESPEARE_POEMS + 1):
-        url = SHAKESPEARE_URL + GetRoman(i) + HTML
-        page = urlopen(url)
-        soup = BeautifulSoup(page, PARSER)
+PARSERS = ["html.parser", "lxml"]
+CACHE_DIR = "./data/raw_html/"
+MANIFEST = "manifest.json"
+
+def Soup(page, parser):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(page, parser)
+
+def StorePoem(poem, dir, manifest):
+    os.makedirs(dir, exist_ok=True)
+    WriteAtomically(dir + poem.title + '.txt', poem.SerializeToString())
+    manifest.Add(poem.title)
+
+def IngestShakespeareSonnets(verbose, fetch=FetchPages, parser=PARSER):
+    manifest = Manifest(SHAKESPEARE_DIR + MANIFEST)
+    titles = [str(i) for i in range(1, NUM_SHAKESPEARE_POEMS + 1)
+              if not manifest.Contains(str(i))]
+    urls = {title: SHAKESPEARE_URL + GetRoman(int(title)) + HTML
+            for title in titles}
+    pages = fetch(urls.values())
+    for title in titles:
+        soup = Soup(pages[urls[title]], parser)
         lines = soup.getText().split("\n")[SHAKESPEARE_START:
                                            SHAKESPEARE_END]
-        poem = GeneratePoem(lines, str(i), SHAKESPEARE, verbose)
-        filename = SHAKESPEARE_DIR + poem.title + '.txt'
-        with open(filename, 'wb+') as store:
-            store.write(poem.SerializeToString())
-
-def IngestSpenserSonnets(verbose):
+        poem = GeneratePoem(lines, title, SHAKESPEARE, verbose)
+        StorePoem(poem, SHAKESPEARE_DIR, manifest)
+
+def IngestSpenserSonnets(verbose, fetch=FetchPages, parser=PARSER):
+    manifest = Manifest(SPENSER_DIR + MANIFEST)
+    urls = [SPENSER_PART_URL + str(i) + HTML
+            for i in range(1, NUM_SPENSER_PARTS + 1)]
+    pages = fetch(urls)
     count = 1
-    for i in range(1, NUM_SPENSER_PARTS + 1):
-        url = SPENSER_PART_URL + str(i) + HTML
-        page = urlopen(url)
-        soup = BeautifulSoup(page, PARSER)
+    for url in urls:
+        soup = Soup(pages[url], parser)
         for poem in soup.select("ul dl"):
+            title = str(count)
+            count += 1
+            if manifest.Contains(title):
+                continue
             lines = poem.getText().splitlines()[1:] # first line blank
-            poem = GeneratePoem(lines, str(count), SPENSER, verbose)
-            count +=1
-            filename = SPENSER_DIR + poem.title + '.txt'
-            with open(filename, 'wb+') as store:
-                store.write(poem.SerializeToString())
-
-def IngestSidneySonnets(verbose):
-    page = urlopen(OLD_SIDNEY_URL)
-    soup = BeautifulSoup(page, PARSER)
+            poem = GeneratePoem(lines, title, SPENSER, verbose)
+            StorePoem(poem, SPENSER_DIR, manifest)
+
+def IngestSidneySonnets(verbose, fetch=FetchPages, parser=PARSER):
+    manifest = Manifest(SIDNEY_DIR + MANIFEST)
+    page = fetch([OLD_SIDNEY_URL])[OLD_SIDNEY_URL]
+    soup = Soup(page, parser)
     count = 1
     for poem in soup.select("blockquote"):
         poem_split_first = poem.getText().splitlines()[1:-1]
@@ -78,13 +95,14 @@ def IngestSidneySonnets(verbose):
         for line in poem_split_first[2:]:
             lines.append(line)
         if len(lines) <= 14:
-            poem = GeneratePoem(lines, str(count), SIDNEY, verbose)
+            title = str(count)
             count+=1
-            filename = SIDNEY_DIR + poem.title + '.txt'
-            with open(filename, 'wb+') as store:
-                store.write(poem.SerializeToString())
+            if manifest.Contains(title):
+                continue
+            poem = GeneratePoem(lines, title, SIDNEY, verbose)
+            StorePoem(poem, SIDNEY_DIR, manifest)
 
-def main():
+def main(args=None):
     parser = optparse.OptionParser()
     parser.add_option("--sidney",
                       help="Ingest Sidney's sonnets.",
@@ -105,13 +123,39 @@ def main():
                       action="store_true",
                       default=False)
 
-    (options, args) = parser.parse_args()
+    parser.add_option("--workers",
+                      help="Number of pages to fetch at once.",
+                      type="int",
+                      default=DEFAULT_WORKERS)
+    parser.add_option("--cache-dir",
+                      help="Directory of cached raw pages.",
+                      default=CACHE_DIR)
+    parser.add_option("--base-url",
+                      help="Fetch pages from this server or directory "
+                           "(e.g. http://localhost:8000/ or "
+                           "file:///path/to/pages/) instead of the web.",
+                      default=None)
+    parser.add_option("--offline",
+                      help="Only use cached pages.",
+                      action="store_true",
+                      default=False)
+    parser.add_option("--parser",
+                      help="HTML parser: %s." % ", ".join(PARSERS),
+                      choices=PARSERS,
+                      default=PARSER)
+
+    (options, args) = parser.parse_args(args)
+    fetch = functools.partial(FetchPages,
+                              cache=PageCache(options.cache_dir),
+                              workers=options.workers,
+                              base_url=options.base_url,
+                              offline=options.offline)
     if options.sidney:
-        IngestSidneySonnets(options.verbose)
+        IngestSidneySonnets(options.verbose, fetch, options.parser)
     if options.shakespeare:
-        IngestShakespeareSonnets(options.verbose)
+        IngestShakespeareSonnets(options.verbose, fetch, options.parser)
     if options.spenser:
-        IngestSpenserSonnets(options.verbose)
+        IngestSpenserSonnets(options.verbose, fetch, options.parser)
 
 
 if __name__ == "__main__":
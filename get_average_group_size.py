@@ -1,10 +1,19 @@
-from data_loader import DataLoader
-from datamuse import datamuse
+from collections import OrderedDict
+from corpus_stats import corpus_report, write_report
+from datamuse_rhymes import DatamuseRhymes
+from functools import partial
+from metrics import Metrics
+from rhyme_cache import RhymeCache
 from rhyme_labeler import RhymeLabeler
-import statistics
+import optparse
 
-DATAMUSE_MAX = 100
-api = datamuse.Datamuse()
+RHYME_CACHE = "data/rhymes.sqlite"
+PREFETCH_WORKERS = 8
+SEQUENCES = OrderedDict([
+    ('Shakespeare - Sonnets', "data/shakespeare_sonnets/"),
+    ('Spenser - Amoretti', "data/spenser_amoretti/"),
+    ('Sidney - Astrophil', "data/sidney_astrophil/"),
+])
 
 # https://stackoverflow.com/questions/3173320/text-progress-bar-in-the-console
 def print_progress(iteration, total, prefix = '', suffix = '',
@@ -29,62 +38,70 @@ def print_progress(iteration, total, prefix = '', suffix = '',
         print()
 
 
-def add_rhymes(words, rhyme_dict):
-    for word in words:
-        if word not in rhyme_dict:
-            rhyme_dict[word] = [d['word'] for d in api.words(rel_rhy=word, max=DATAMUSE_MAX)]
+def print_sequence_progress(metrics, started, name, iteration, total):
+    if name not in started:
+        started.add(name)
+        print('%s:' % name)
+    progress = metrics.progress(name, iteration, total)
+    suffix = 'Complete'
+    if progress.rate is not None:
+        suffix = 'Complete (%.1f poems/s, ETA %ds)' % (progress.rate,
+                                                       progress.eta)
+    print_progress(iteration, total, prefix = 'Progress:',
+                   suffix = suffix.ljust(40))
 
-# Create rhyme labeler.
-rhyme_labeler = RhymeLabeler(add_rhymes)
+def format_stat(value, format='%f'):
+    '''
+    Format a statistic of a report, which is None ("n/a") without
+    enough groups.
+    '''
+    return 'n/a' if value is None else format % value
 
-# SHAKESPEARE
-shakespeare_data = DataLoader("data/shakespeare_sonnets/")
-group_sizes = []
-i = 0
-l = len(shakespeare_data.poems)
-print('Shakespeare - Sonnets:')
-print_progress(0, l, prefix = 'Progress:', suffix = 'Complete')
-for poem in shakespeare_data.poems.values():
-    groups = rhyme_labeler.get_rhyme_scheme(poem)
-    group_sizes += [len(group) for group in groups]
-    i += 1
-    print_progress(i, l, prefix = 'Progress:', suffix = 'Complete')
+def main(args=None):
+    parser = optparse.OptionParser(
+        usage="%prog [options] [name=directory ...]",
+        description="Print the rhyme group sizes of sonnet sequences "
+                    "(by default Shakespeare's, Spenser's and Sidney's).")
+    parser.add_option("--workers", type="int", default=1,
+                      help="Number of processes to label with.")
+    parser.add_option("--report",
+                      help="Also save the statistics as JSON to this file.")
+    parser.add_option("--metrics",
+                      help="Save timings and counters of the run as JSON "
+                           "to this file.")
+    (options, args) = parser.parse_args(args)
 
-print('Average group size: %f' % (sum(group_sizes)/len(group_sizes)))
-print('Largest group size: %d' % (max(group_sizes)))
-print('Standard deviation: %f' % (statistics.stdev(group_sizes)))
+    sequences = SEQUENCES
+    if args:
+        sequences = OrderedDict(arg.split('=', 1) if '=' in arg
+                                else (arg, arg) for arg in args)
 
+    # Create rhyme labeler, keeping rhymes in a cache that persists
+    # between runs.
+    metrics = Metrics()
+    rhyme_cache = RhymeCache(RHYME_CACHE)
+    rhymes = DatamuseRhymes(metrics=metrics)
+    rhyme_labeler = RhymeLabeler(rhymes.add_rhymes, rhyme_cache,
+                                 metrics=metrics)
+    report = corpus_report(sequences, rhyme_labeler,
+                           workers=options.workers,
+                           prefetch={'workers': PREFETCH_WORKERS},
+                           progress=partial(print_sequence_progress,
+                                            metrics, set()),
+                           metrics=metrics)
+    metrics.set_value('rhyme_cache', rhyme_cache.stats())
+    metrics.set_value('scheme_memo', rhyme_labeler.scheme_memo_stats())
 
-# SPENSER
-spenser_data = DataLoader("data/spenser_amoretti/")
-group_sizes = []
-l = len(spenser_data.poems)
-i = 0
-print('Spenser - Amoretti:')
-print_progress(i, l, prefix = 'Progress:', suffix = 'Complete')
-for poem in spenser_data.poems.values():
-    groups = rhyme_labeler.get_rhyme_scheme(poem)
-    group_sizes += [len(group) for group in groups]
-    i += 1
-    print_progress(i, l, prefix = 'Progress:', suffix = 'Complete')
+    for name, stats in report['sequences'].items():
+        print('%s:' % name)
+        print('Average group size: %s' % format_stat(stats['average']))
+        print('Largest group size: %s' % format_stat(stats['largest'], '%d'))
+        print('Standard deviation: %s' % format_stat(stats['stdev']))
 
-print('Average group size: %f' % (sum(group_sizes)/len(group_sizes)))
-print('Largest group size: %d' % (max(group_sizes)))
-print('Standard deviation: %f' % (statistics.stdev(group_sizes)))
+    if options.report:
+        write_report(report, options.report)
+    if options.metrics:
+        metrics.dump(options.metrics)
 
-# SIDNEY
-sidney_data = DataLoader("data/sidney_astrophil/")
-group_sizes = []
-i = 0
-l = len(sidney_data.poems)
-print('Sidney - Astrophil:')
-print_progress(0, l, prefix = 'Progress:', suffix = 'Complete')
-for poem in sidney_data.poems.values():
-    groups = rhyme_labeler.get_rhyme_scheme(poem)
-    group_sizes += [len(group) for group in groups]
-    i += 1
-    print_progress(i, l, prefix = 'Progress:', suffix = 'Complete')
-
-print('Average group size: %f' % (sum(group_sizes)/len(group_sizes)))
-print('Largest group size: %d' % (max(group_sizes)))
-print('Standard deviation: %f' % (statistics.stdev(group_sizes)))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+'''
+Resident labeling service on localhost.
+
+The rhyme dictionary and RhymeLabeler are loaded once, and poems are
+labeled over HTTP:
+
+    POST /label         a serialized Poem; returns it labeled
+    POST /label_batch   varint-delimited serialized Poems (see
+                        packed_corpus.encode_delimited); returns them
+                        labeled, in the same framing
+    GET  /stats         request, batch, latency and queue statistics
+
+The labeling options are given as query parameters, e.g.
+/label?scheme=1&group=0; both default to 1. Concurrent requests are
+queued and labeled together: a single thread takes every request that
+arrives within a short window (up to a maximum number of poems) and
+labels them with one RhymeLabeler.label_corpus call per set of
+options, so scheme labeling is vectorized over the whole batch. If
+that call fails, the requests are labeled one by one, so only the
+faulty requests get an error.
+
+    python3 labeling_service.py --rhyme-dict data/rhymes.bin --port 8765
+'''
+
+import json
+import optparse
+import queue
+import threading
+import time
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import Request, urlopen
+
+from google.protobuf.message import DecodeError
+
+from packed_corpus import decode_delimited, encode_delimited
+from proto.Poem_pb2 import *
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT = 0.002
+LATENCY_WINDOW = 1000
+PROTOBUF_TYPE = 'application/x-protobuf'
+
+class _Request(object):
+    '''
+    Poems waiting to be labeled together, and their result.
+    '''
+
+    def __init__(self, poems, scheme, group):
+        self.poems = poems
+        self.options = (scheme, group)
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.error = None
+
+class LabelingService(object):
+    '''
+    Queue of labeling requests served in micro-batches by one
+    thread, which owns the labeler.
+    '''
+
+    def __init__(self, rhyme_labeler, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT):
+        '''
+        Constructor of a LabelingService. Call start() to begin
+        serving.
+        :param rhyme_labeler: the RhymeLabeler to label with. Only
+        the service thread uses it.
+        :param max_batch: the most poems labeled in one batch; a
+        larger request is still labeled as a whole.
+        :param max_wait: the longest time, in seconds, to wait for
+        more requests before labeling a batch.
+        '''
+        self.rhyme_labeler = rhyme_labeler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._requests = 0
+        self._poems = 0
+        self._batches = 0
+        self._errors = 0
+        self._max_queue_depth = 0
+
+    def start(self):
+        '''
+        Start the service thread.
+        '''
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop the service thread once the queued requests are done.
+        '''
+        self._queue.put(None)
+        self._thread.join()
+
+    def label(self, poems, scheme=True, group=True):
+        '''
+        Label poems in the next batch, waiting until they are done.
+        :param poems: a list of Poem protos, labeled in place.
+        :param scheme: see RhymeLabeler.get_rhyme_scheme.
+        :param group: see RhymeLabeler.get_rhyme_scheme.
+        '''
+        if not (scheme or group):
+            raise ValueError("One rhyming option must be True.")
+        request = _Request(poems, scheme, group)
+        self._queue.put(request)
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth,
+                                        self._queue.qsize())
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+
+    def _next_batch(self):
+        '''
+        Wait for a request, then gather the requests arriving within
+        max_wait, up to max_batch poems.
+        :return: the list of requests, or None to stop.
+        '''
+        request = self._queue.get()
+        if request is None:
+            return None
+        batch = [request]
+        size = len(request.poems)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # Serve this batch, then stop.
+                self._queue.put(None)
+                break
+            batch.append(request)
+            size += len(request.poems)
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            by_options = {}
+            for request in batch:
+                by_options.setdefault(request.options, []).append(request)
+            for (scheme, group), requests in by_options.items():
+                poems = [poem for request in requests
+                         for poem in request.poems]
+                try:
+                    self.rhyme_labeler.label_corpus(poems, scheme, group)
+                except Exception as error:
+                    if len(requests) == 1:
+                        requests[0].error = error
+                        continue
+                    # Label the requests one by one, so that only the
+                    # faulty ones fail.
+                    for request in requests:
+                        try:
+                            self.rhyme_labeler.label_corpus(request.poems,
+                                                            scheme, group)
+                        except Exception as request_error:
+                            request.error = request_error
+            now = time.perf_counter()
+            with self._lock:
+                self._batches += 1
+                for request in batch:
+                    self._requests += 1
+                    self._poems += len(request.poems)
+                    self._errors += request.error is not None
+                    self._latencies.append(now - request.enqueued)
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        '''
+        :return: a JSON-serializable dictionary of the requests,
+        poems and batches served, the current and largest queue
+        depth, and latency percentiles in milliseconds over the
+        last requests.
+        '''
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {'requests': self._requests,
+                     'poems': self._poems,
+                     'batches': self._batches,
+                     'errors': self._errors,
+                     'mean_batch_poems': (self._poems / self._batches
+                                          if self._batches else None),
+                     'queue_depth': self._queue.qsize(),
+                     'max_queue_depth': self._max_queue_depth}
+        for p in [50, 90, 99]:
+            stats['p%d_ms' % p] = None
+            if latencies:
+                rank = min(len(latencies) - 1, len(latencies) * p // 100)
+                stats['p%d_ms' % p] = latencies[rank] * 1e3
+        return stats
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    HTTP front end of the LabelingService of its server.
+    '''
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, message.encode('utf-8'), 'text/plain')
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/stats':
+            return self._error(404, 'Not found.')
+        self._reply(200, json.dumps(self.server.service.stats()).encode('utf-8'),
+                    'application/json')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ('/label', '/label_batch'):
+            return self._error(404, 'Not found.')
+        query = parse_qs(url.query)
+        scheme = query.get('scheme', ['1'])[0] != '0'
+        group = query.get('group', ['1'])[0] != '0'
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            records = ([body] if url.path == '/label'
+                       else decode_delimited(body))
+            poems = []
+            for data in records:
+                poem = Poem()
+                poem.ParseFromString(data)
+                poems.append(poem)
+            self.server.service.label(poems, scheme, group)
+        except (DecodeError, IndexError, ValueError) as error:
+            return self._error(400, str(error))
+        except Exception as error:
+            return self._error(500, str(error))
+        records = [poem.SerializeToString() for poem in poems]
+        self._reply(200, records[0] if url.path == '/label'
+                    else encode_delimited(records), PROTOBUF_TYPE)
+
+    def log_message(self, format, *args):
+        # Latencies are reported by /stats instead.
+        pass
+
+class LabelingServer(ThreadingHTTPServer):
+    '''
+    HTTP server of a LabelingService.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        '''
+        Constructor of a LabelingServer. The port is bound at once;
+        pass port 0 to pick a free one, then read server_address.
+        :param service: the LabelingService to serve; started if it
+        was not.
+        :param host: the address to listen on.
+        :param port: the port to listen on.
+        '''
+        ThreadingHTTPServer.__init__(self, (host, port), _Handler)
+        self.service = service
+        if service._thread is None:
+            service.start()
+
+    def url(self):
+        '''
+        :return: the base URL of the server.
+        '''
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def server_close(self):
+        ThreadingHTTPServer.server_close(self)
+        self.service.stop()
+
+class LabelingClient(object):
+    '''
+    Client of a LabelingServer.
+    '''
+
+    def __init__(self, url='http://%s:%d' % (DEFAULT_HOST, DEFAULT_PORT),
+                 timeout=60):
+        '''
+        Constructor of a LabelingClient.
+        :param url: the base URL of the server.
+        :param timeout: the request timeout, in seconds.
+        '''
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _post(self, path, body, scheme, group):
+        request = Request('%s%s?scheme=%d&group=%d'
+                          % (self.url, path, scheme, group),
+                          data=body,
+                          headers={'Content-Type': PROTOBUF_TYPE})
+        with urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def label(self, poem, scheme=True, group=True):
+        '''
+        Label a poem, replacing its rhyme_sets with those labeled
+        by the server.
+        :param poem: the Poem proto.
+        :param scheme: see RhymeLabeler.get_rhyme_scheme.
+        :param group: see RhymeLabeler.get_rhyme_scheme.
+        :return: the rhyme scheme, as RhymeLabeler.get_rhyme_scheme
+        returns it.
+        '''
+        poem.ParseFromString(self._post('/label', poem.SerializeToString(),
+                                        scheme, group))
+        return [list(rhyme_set.rhyme_indices)
+                for rhyme_set in poem.rhyme_sets]
+
+    def label_batch(self, poems, scheme=True, group=True):
+        '''
+        Label many poems in one request, replacing the rhyme_sets
+        of each one.
+        :param poems: a list of Poem protos.
+        :param scheme: see RhymeLabeler.get_rhyme_scheme.
+        :param group: see RhymeLabeler.get_rhyme_scheme.
+        :return: the rhyme schemes of the poems, in order.
+        '''
+        body = encode_delimited(poem.SerializeToString() for poem in poems)
+        records = decode_delimited(self._post('/label_batch', body,
+                                              scheme, group))
+        for poem, data in zip(poems, records):
+            poem.ParseFromString(data)
+        return [[list(rhyme_set.rhyme_indices)
+                 for rhyme_set in poem.rhyme_sets] for poem in poems]
+
+    def stats(self):
+        '''
+        :return: the statistics of the service, see
+        LabelingService.stats.
+        '''
+        with urlopen(self.url + '/stats', timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+def main():
+    parser = optparse.OptionParser(
+        description="Serve rhyme labeling over HTTP on localhost.")
+    parser.add_option("--host", default=DEFAULT_HOST)
+    parser.add_option("--port", type="int", default=DEFAULT_PORT)
+    parser.add_option("--rhyme-dict",
+                      help="Rhyme dictionary file (CSV or binary) to load.")
+    parser.add_option("--rhyme-cache",
+                      help="RhymeCache database to keep rhymes in instead.")
+    parser.add_option("--cmudict",
+                      help="Look up missing rhymes in this pronunciation "
+                           "file instead of Datamuse.")
+    parser.add_option("--max-batch", type="int", default=DEFAULT_MAX_BATCH,
+                      help="Most poems labeled in one batch.")
+    parser.add_option("--max-wait", type="float", default=DEFAULT_MAX_WAIT,
+                      help="Seconds to wait for more requests to batch.")
+    (options, args) = parser.parse_args()
+
+    from rhyme_labeler import RhymeLabeler
+
+    if options.cmudict:
+        from phonetic_rhymes import PhoneticRhymes
+        add_rhymes = PhoneticRhymes.from_file(options.cmudict).add_rhymes
+    else:
+        from datamuse_rhymes import DatamuseRhymes
+        add_rhymes = DatamuseRhymes().add_rhymes
+    if options.rhyme_dict:
+        rhyme_labeler = RhymeLabeler.from_file(options.rhyme_dict, add_rhymes)
+    else:
+        rhyme_dict = None
+        if options.rhyme_cache:
+            from rhyme_cache import RhymeCache
+            rhyme_dict = RhymeCache(options.rhyme_cache)
+        rhyme_labeler = RhymeLabeler(add_rhymes, rhyme_dict)
+
+    service = LabelingService(rhyme_labeler, options.max_batch,
+                              options.max_wait)
+    server = LabelingServer(service, options.host, options.port)
+    print('Serving on %s' % server.url())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
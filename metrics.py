@@ -0,0 +1,190 @@
+'''
+Opt-in instrumentation of labeling runs: wall time and call counts
+per stage, counters (rhyme dictionary lookups and misses, bytes read
+and written, provider calls), arbitrary values such as cache
+statistics, and the progress of long loops.
+
+Instrumented classes take a Metrics object and default to
+NULL_METRICS, which is disabled: its timers are a shared no-op
+context manager and its counters return at once, so leaving
+instrumentation in hot paths costs next to nothing.
+
+    metrics = Metrics()
+    labeler = RhymeLabeler(add_rhymes, metrics=metrics)
+    with metrics.timer('run'):
+        labeler.label_corpus(poems)
+    metrics.dump('metrics.json')
+
+Timers nest: the time of an inner stage is also part of the stages
+it runs in.
+'''
+
+import json
+import threading
+import time
+
+from collections import namedtuple
+
+'''
+Progress of a loop: the items done, the total, the seconds since
+the first report and, once known, the items per second and the
+estimated seconds left.
+'''
+Progress = namedtuple('Progress', ['done', 'total', 'elapsed', 'rate',
+                                   'eta'])
+
+class _NullTimer(object):
+    '''
+    Timer of disabled metrics.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer(object):
+    '''
+    Context manager adding its wall time to a Metrics timer.
+    '''
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.add_time(self._name, time.perf_counter() - self._start)
+        return False
+
+class Metrics(object):
+    '''
+    Thread-safe collection of timers, counters and values.
+    '''
+
+    def __init__(self, enabled=True):
+        '''
+        Constructor of a Metrics.
+        :param enabled: if set to False, nothing is recorded.
+        '''
+        self.enabled = enabled
+        self.timers = {}
+        self.counters = {}
+        self.values = {}
+        self._progress = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def timer(self, name):
+        '''
+        Time a stage.
+        :param name: the name of the stage.
+        :return: a context manager adding its wall time and one
+        call to the stage.
+        '''
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds, calls=1):
+        '''
+        Record time spent in a stage.
+        :param name: the name of the stage.
+        :param seconds: the wall time.
+        :param calls: the number of calls it took.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+
+    def count(self, name, amount=1):
+        '''
+        Increase a counter.
+        :param name: the name of the counter.
+        :param amount: the amount to add.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_value(self, name, value):
+        '''
+        Record a JSON-serializable value, e.g. RhymeCache.stats().
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.values[name] = value
+
+    def hit_rate(self, lookups, misses):
+        '''
+        :param lookups: the name of a counter of lookups.
+        :param misses: the name of a counter of the lookups that
+        missed.
+        :return: the rate of lookups that hit, or None before any
+        lookup.
+        '''
+        total = self.counters.get(lookups, 0)
+        if not total:
+            return None
+        return 1 - self.counters.get(misses, 0) / total
+
+    def progress(self, name, done, total):
+        '''
+        Report the progress of a loop. Unlike the other methods,
+        this works when disabled, so it can drive progress bars.
+        :param name: the name of the loop.
+        :param done: the number of items done so far.
+        :param total: the total number of items.
+        :return: a Progress. The rate is measured from the first
+        report of the loop.
+        '''
+        now = time.perf_counter()
+        with self._lock:
+            start, start_done = self._progress.setdefault(name, (now, done))
+        elapsed = now - start
+        rate = eta = None
+        if elapsed > 0 and done > start_done:
+            rate = (done - start_done) / elapsed
+            eta = (total - done) / rate
+        return Progress(done, total, elapsed, rate, eta)
+
+    def to_dict(self):
+        '''
+        :return: the metrics as a JSON-serializable dictionary,
+        with the total and mean seconds and the calls of every
+        timer, and the hit rate of the rhyme dictionary.
+        '''
+        with self._lock:
+            timers = {name: {'calls': calls, 'seconds': seconds,
+                             'mean_seconds': seconds / calls if calls else None}
+                      for name, (calls, seconds) in sorted(self.timers.items())}
+            counters = dict(sorted(self.counters.items()))
+            values = dict(self.values)
+        return {'elapsed_seconds': time.perf_counter() - self._start,
+                'timers': timers,
+                'counters': counters,
+                'rhyme_dict_hit_rate': self.hit_rate('rhyme_dict.lookups',
+                                                     'rhyme_dict.misses'),
+                'values': values}
+
+    def dump(self, filename):
+        '''
+        Save the metrics as JSON.
+        :param filename: the file to write.
+        '''
+        with open(filename, 'w') as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+            metrics_file.write('\n')
+
+NULL_METRICS = Metrics(enabled=False)
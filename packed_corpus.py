@@ -0,0 +1,223 @@
+'''
+Single-file corpus format: a stream of length-delimited serialized
+Poem records followed by an index of their offsets, so one file can
+replace a directory of per-poem files and still be read by title.
+
+Layout:
+    header    magic (8 bytes), version (uint32)
+    records   varint length + serialized Poem, one per poem
+    index     per poem: varint title length, UTF-8 title,
+              record offset (uint64), record size (uint32)
+    footer    index offset (uint64), poem count (uint32), magic
+
+Integers other than varints are little-endian.
+'''
+
+import mmap
+import os
+
+from collections import OrderedDict, namedtuple
+from struct import Struct
+
+MAGIC = b'POEMPACK'
+VERSION = 1
+HEADER = Struct('<8sI')
+INDEX_ENTRY = Struct('<QI')
+FOOTER = Struct('<QI8s')
+
+'''
+Location of one serialized Poem in a packed corpus.
+'''
+PackedRecord = namedtuple('PackedRecord', ['offset', 'size'])
+
+def _encode_varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+def _decode_varint(buffer, offset):
+    '''
+    :return: the decoded value and the offset after it.
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+def encode_delimited(records):
+    '''
+    Frame serialized messages the way the records of a packed corpus
+    are: each one preceded by its varint length.
+    :param records: an iterable of bytes.
+    :return: the framed bytes.
+    '''
+    return b''.join(_encode_varint(len(data)) + data for data in records)
+
+def decode_delimited(buffer):
+    '''
+    Split messages framed by encode_delimited.
+    :param buffer: the framed bytes.
+    :return: the list of messages, as bytes.
+    '''
+    records = []
+    offset = 0
+    while offset < len(buffer):
+        length, offset = _decode_varint(buffer, offset)
+        if offset + length > len(buffer):
+            raise ValueError('Truncated delimited record.')
+        records.append(bytes(buffer[offset:offset + length]))
+        offset += length
+    return records
+
+def is_packed_corpus(path):
+    '''
+    Check whether a path is a packed corpus file.
+    :param path: a file or directory path.
+    :return: True if the path is a file starting with the magic bytes.
+    '''
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as packed_file:
+        return packed_file.read(len(MAGIC)) == MAGIC
+
+def write_packed_records(records, filename, fsync=False):
+    '''
+    Write serialized poems to a packed corpus. The file is written
+    to a temporary path and renamed into place, so readers never see
+    it half-written.
+    :param records: an iterable of (title, serialized Poem) pairs.
+    :param filename: the file to write.
+    :param fsync: if True, flush the file to disk before renaming it.
+    '''
+    tmp_filename = filename + '.tmp'
+    index = []
+    with open(tmp_filename, 'wb') as packed_file:
+        packed_file.write(HEADER.pack(MAGIC, VERSION))
+        for title, data in records:
+            packed_file.write(_encode_varint(len(data)))
+            index.append((title, packed_file.tell(), len(data)))
+            packed_file.write(data)
+        index_offset = packed_file.tell()
+        for title, offset, size in index:
+            title = title.encode('utf-8')
+            packed_file.write(_encode_varint(len(title)))
+            packed_file.write(title)
+            packed_file.write(INDEX_ENTRY.pack(offset, size))
+        packed_file.write(FOOTER.pack(index_offset, len(index), MAGIC))
+        if fsync:
+            packed_file.flush()
+            os.fsync(packed_file.fileno())
+    os.replace(tmp_filename, filename)
+
+def write_packed(poems, filename):
+    '''
+    Write Poem objects to a packed corpus.
+    :param poems: an iterable of Poem protos.
+    :param filename: the file to write.
+    '''
+    write_packed_records(((poem.title, poem.SerializeToString())
+                          for poem in poems), filename)
+
+def pack_directory(dir, filename):
+    '''
+    Convert a directory of poem files, as written by generate_dataset,
+    to a packed corpus. Poems are streamed, not all held in memory.
+    :param dir: the directory of the sequence.
+    :param filename: the packed corpus file to write.
+    '''
+    from data_loader import DataLoader
+    write_packed(DataLoader(dir).iter_poems(), filename)
+
+def unpack_to_directory(filename, dir):
+    '''
+    Convert a packed corpus to a directory of poem files.
+    :param filename: the packed corpus file.
+    :param dir: the directory to write the poems to.
+    '''
+    os.makedirs(dir, exist_ok=True)
+    corpus = PackedCorpus(filename)
+    try:
+        for title, data in corpus.iter_records():
+            path = os.path.join(dir, title + '.txt')
+            with open(path, 'wb') as poem_file:
+                poem_file.write(data)
+    finally:
+        corpus.close()
+
+class PackedCorpus(object):
+    '''
+    Reader of a packed corpus through a memory map.
+    '''
+
+    def __init__(self, filename):
+        '''
+        Constructor of a PackedCorpus. Only the index is read.
+        :param filename: the packed corpus file.
+        '''
+        self.filename = filename
+        with open(filename, 'rb') as packed_file:
+            self._mmap = mmap.mmap(packed_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self._mmap)
+        index_offset, count, end_magic = FOOTER.unpack_from(
+            self._mmap, len(self._mmap) - FOOTER.size)
+        if magic != MAGIC or end_magic != MAGIC:
+            raise ValueError('%s is not a packed corpus.' % filename)
+        if version != VERSION:
+            raise ValueError('Unsupported packed corpus version %d.'
+                             % version)
+
+        self.index = OrderedDict()
+        offset = index_offset
+        for _ in range(count):
+            length, offset = _decode_varint(self._mmap, offset)
+            title = self._mmap[offset:offset + length].decode('utf-8')
+            offset += length
+            self.index[title] = PackedRecord(
+                *INDEX_ENTRY.unpack_from(self._mmap, offset))
+            offset += INDEX_ENTRY.size
+
+    def read_record(self, title):
+        '''
+        Get the serialized Poem with a title.
+        :param title: the title of the poem.
+        :return: the serialized Poem as bytes.
+        '''
+        record = self.index[title]
+        return self._mmap[record.offset:record.offset + record.size]
+
+    def advise_sequential(self):
+        '''
+        Tell the kernel the file is about to be read in order, so it
+        reads ahead in large blocks.
+        '''
+        if hasattr(self._mmap, 'madvise'):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+    def iter_records(self):
+        '''
+        Iterate over every serialized poem in file order, reading the
+        file sequentially.
+        :return: a generator of (title, serialized Poem) pairs.
+        '''
+        self.advise_sequential()
+        records = sorted(self.index.items(), key=lambda item: item[1].offset)
+        for title, record in records:
+            yield title, self._mmap[record.offset:record.offset + record.size]
+
+    def close(self):
+        '''
+        Release the memory map.
+        '''
+        self._mmap.close()
@@ -0,0 +1,135 @@
+'''
+Offline rhyme lookup based on a CMUdict-style pronunciation table.
+
+Words rhyme when they share a rhyme key: the last stressed vowel of
+the pronunciation and every phone after it. Use the `add_rhymes` method
+of a `PhoneticRhymes` object anywhere a RhymeLabeler expects its
+`add_rhymes` callback, e.g.
+
+    rhymes = PhoneticRhymes.from_file('cmudict.dict')
+    rhyme_labeler = RhymeLabeler(rhymes.add_rhymes)
+'''
+
+# Phones carrying a stress digit are vowels; 1 is primary stress,
+# 2 secondary and 0 unstressed.
+PRIMARY_STRESS = '1'
+SECONDARY_STRESS = '2'
+COMMENT_PREFIXES = (';;;', '#')
+
+class PhoneticRhymes(object):
+    '''
+    Index of pronunciations by rhyme key, used to answer rhyme
+    queries with dictionary lookups instead of network calls.
+    '''
+
+    def __init__(self, pronunciations):
+        '''
+        Constructor of a PhoneticRhymes index.
+        :param pronunciations: a dictionary from lowercase words to
+        a list of pronunciations, each a list of ARPAbet phones.
+        '''
+        self._keys = {}
+        self._index = {}
+        for word, variants in pronunciations.items():
+            keys = set()
+            for phones in variants:
+                key = rhyme_key(phones)
+                if key:
+                    keys.add(key)
+            if keys:
+                self._keys[word] = keys
+                for key in keys:
+                    self._index.setdefault(key, set()).add(word)
+
+        # Freeze the groups so every word of a rhyme key shares
+        # one object in the rhyme dictionary.
+        self._index = {key: frozenset(words)
+                       for key, words in self._index.items()}
+        self._rhymes = {}
+
+    @classmethod
+    def from_file(cls, filename):
+        '''
+        Constructor of a PhoneticRhymes index from a pronunciation
+        file in CMUdict format. Both the classic format
+        ("LOVE  L AH1 V", "LOVE(1) ...") and the lowercase format of
+        cmudict.dict ("love l ah1 v", "love(2) ...") are accepted.
+        :param filename: the name of the file.
+        '''
+        pronunciations = {}
+        with open(filename, 'r', encoding='latin-1') as cmu_file:
+            for line in cmu_file:
+                if line.startswith(COMMENT_PREFIXES):
+                    continue
+                line = line.split('#')[0].split()
+                if len(line) < 2:
+                    continue
+                word = line[0].lower()
+                if word.endswith(')') and '(' in word:
+                    word = word[:word.rindex('(')]
+                phones = [phone.upper() for phone in line[1:]]
+                pronunciations.setdefault(word, []).append(phones)
+        return cls(pronunciations)
+
+    def rhymes(self, word):
+        '''
+        Get the words that rhyme with a word. Words with several
+        pronunciations rhyme with the words of all of them. The word
+        itself is part of its rhymes.
+        :param word: the word to look up (case insensitive).
+        :return: a frozenset of lowercase rhyming words, empty if
+        the word is not in the pronunciation table.
+        '''
+        word = word.lower()
+        if word not in self._rhymes:
+            keys = self._keys.get(word, ())
+            if len(keys) == 1:
+                rhymes = self._index[next(iter(keys))]
+            else:
+                rhymes = frozenset().union(*[self._index[key]
+                                             for key in keys])
+            self._rhymes[word] = rhymes
+        return self._rhymes[word]
+
+    def do_rhyme(self, word, other_word):
+        '''
+        Check whether two words rhyme.
+        :return: True if the words share a rhyme key.
+        '''
+        keys = self._keys.get(word.lower())
+        other_keys = self._keys.get(other_word.lower())
+        return bool(keys and other_keys and not keys.isdisjoint(other_keys))
+
+    def add_rhymes(self, words, rhyme_dict):
+        '''
+        Mutator with the signature RhymeLabeler expects of its
+        add_rhymes callback: adds the rhymes of every word missing
+        from the rhyme dictionary.
+        :param words: the words to look up.
+        :param rhyme_dict: the rhyme dictionary to add them to.
+        '''
+        for word in words:
+            if word not in rhyme_dict:
+                rhyme_dict[word] = self.rhymes(word)
+
+def rhyme_key(phones):
+    '''
+    Get the rhyme key of a pronunciation: the last primary stressed
+    vowel and everything after it, without stress markers. Falls back
+    to the last secondary stressed vowel, then to the last vowel.
+    :param phones: a list of ARPAbet phones, e.g. ['L', 'AH1', 'V'].
+    :return: the rhyme key as a string, e.g. 'AH V', or None if the
+    pronunciation has no vowel.
+    '''
+    start = None
+    for stress in (PRIMARY_STRESS, SECONDARY_STRESS, None):
+        for i in range(len(phones) - 1, -1, -1):
+            last = phones[i][-1]
+            if last.isdigit() and (stress is None or last == stress):
+                start = i
+                break
+        if start is not None:
+            break
+    if start is None:
+        return None
+    return ' '.join(phone.rstrip('012') for phone in phones[start:])
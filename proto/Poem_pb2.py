@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: Poem.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nPoem.proto\"5\n\x04Line\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\r\n\x05index\x18\x02 \x01(\r\x12\x10\n\x08\x65nd_word\x18\x03 \x01(\t\"\x1e\n\x06Stanza\x12\x14\n\x05lines\x18\x01 \x03(\x0b\x32\x05.Line\"5\n\x08RhymeSet\x12\x15\n\rrhyme_indices\x18\x01 \x03(\r\x12\x12\n\nroot_rhyme\x18\x02 \x01(\t\"\xf3\x01\n\x04Poem\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x1c\n\x06\x65ntity\x18\x03 \x03(\x0b\x32\x0c.Poem.Entity\x12\x1d\n\nrhyme_sets\x18\x04 \x03(\x0b\x32\t.RhymeSet\x12\x19\n\x11label_fingerprint\x18\x05 \x01(\t\x12\x18\n\x10label_confidence\x18\x06 \x01(\x02\x12\x14\n\x0clabel_source\x18\x07 \x01(\t\x1a\x44\n\x06\x45ntity\x12\x19\n\x06stanza\x18\x01 \x01(\x0b\x32\x07.StanzaH\x00\x12\x15\n\x04line\x18\x02 \x01(\x0b\x32\x05.LineH\x00\x42\x08\n\x06\x65ntity')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'Poem_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _LINE._serialized_start=14
+  _LINE._serialized_end=67
+  _STANZA._serialized_start=69
+  _STANZA._serialized_end=99
+  _RHYMESET._serialized_start=101
+  _RHYMESET._serialized_end=154
+  _POEM._serialized_start=157
+  _POEM._serialized_end=400
+  _POEM_ENTITY._serialized_start=332
+  _POEM_ENTITY._serialized_end=400
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,182 @@
+'''
+Persistent rhyme dictionary backed by sqlite, with a bounded
+in-memory LRU in front of it.
+
+A RhymeCache is a drop-in rhyme_dict for RhymeLabeler: the add_rhymes
+callback only queries its provider for words missing from the cache,
+and every word it adds is written through to disk, so later runs (and
+other processes sharing the same file) never look it up again.
+'''
+
+import json
+import sqlite3
+import threading
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TIMEOUT = 30.0
+
+class RhymeCache(MutableMapping):
+    '''
+    Mapping from words to lists of rhymes stored in a sqlite file.
+    Safe to share between threads, and between processes opening
+    the same file.
+    '''
+
+    def __init__(self, filename, max_entries=DEFAULT_MAX_ENTRIES,
+                 timeout=DEFAULT_TIMEOUT):
+        '''
+        Constructor of a RhymeCache.
+        :param filename: the sqlite file to store rhymes in. It is
+        created if it does not exist.
+        :param max_entries: the maximum number of words kept in
+        memory. Evicted words stay on disk.
+        :param timeout: seconds to wait for another process holding
+        a lock on the file.
+        '''
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Incremented whenever cached rhymes are replaced or deleted,
+        # so that users of the rhymes can tell theirs are stale.
+        self.version = 0
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(filename, timeout=timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        # Write-ahead logging lets readers run alongside a writer.
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS rhymes '
+                         '(word TEXT PRIMARY KEY, rhymes TEXT NOT NULL)')
+
+    def _remember(self, word, rhymes):
+        '''
+        Put a word at the front of the in-memory LRU, evicting the
+        least recently used words if it is full.
+        '''
+        self._memory[word] = rhymes
+        self._memory.move_to_end(word)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, word):
+        '''
+        Get the rhymes of a word from memory, falling back to disk.
+        :return: the rhymes, or None if the word is not cached.
+        '''
+        with self._lock:
+            if word in self._memory:
+                self._memory.move_to_end(word)
+                self.hits += 1
+                return self._memory[word]
+            row = self._db.execute('SELECT rhymes FROM rhymes WHERE word = ?',
+                                   (word,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            rhymes = json.loads(row[0])
+            self._remember(word, rhymes)
+            return rhymes
+
+    def _stored(self, word):
+        '''
+        :return: True if a word is cached, without counting a hit or
+        a miss.
+        '''
+        if word in self._memory:
+            return True
+        return self._db.execute('SELECT 1 FROM rhymes WHERE word = ?',
+                                (word,)).fetchone() is not None
+
+    def has(self, word):
+        '''
+        Check whether a word is cached, like `in`, but without
+        counting a hit or a miss or reordering the LRU.
+        '''
+        with self._lock:
+            return self._stored(word)
+
+    def __getitem__(self, word):
+        rhymes = self._load(word)
+        if rhymes is None:
+            raise KeyError(word)
+        return rhymes
+
+    def __contains__(self, word):
+        return self._load(word) is not None
+
+    def __setitem__(self, word, rhymes):
+        rhymes = list(rhymes)
+        with self._lock:
+            if self._stored(word):
+                self.version += 1
+            self._db.execute('INSERT OR REPLACE INTO rhymes VALUES (?, ?)',
+                             (word, json.dumps(rhymes)))
+            self._remember(word, rhymes)
+
+    def __delitem__(self, word):
+        with self._lock:
+            deleted = self._db.execute('DELETE FROM rhymes WHERE word = ?',
+                                       (word,)).rowcount
+            self._memory.pop(word, None)
+            if deleted:
+                self.version += 1
+        if not deleted:
+            raise KeyError(word)
+
+    def __iter__(self):
+        with self._lock:
+            words = [row[0] for row
+                     in self._db.execute('SELECT word FROM rhymes')]
+        return iter(words)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM rhymes').fetchone()[0]
+
+    def update_many(self, rhyme_dict):
+        '''
+        Write many words in a single transaction.
+        :param rhyme_dict: a mapping from words to rhymes.
+        '''
+        rows = [(word, json.dumps(list(rhymes)))
+                for word, rhymes in rhyme_dict.items()]
+        with self._lock:
+            if any(self._stored(word) for word in rhyme_dict):
+                self.version += 1
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.executemany('INSERT OR REPLACE INTO rhymes '
+                                     'VALUES (?, ?)', rows)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            for word, rhymes in rhyme_dict.items():
+                self._remember(word, list(rhymes))
+
+    def stats(self):
+        '''
+        Get the cache counters.
+        :return: a dictionary of hits, misses, evictions and the
+        number of words in memory.
+        '''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'in_memory': len(self._memory)}
+
+    def close(self):
+        '''
+        Close the underlying database.
+        '''
+        with self._lock:
+            self._db.close()
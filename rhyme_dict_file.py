@@ -0,0 +1,272 @@
+'''
+Compact binary rhyme dictionary format, read lazily through mmap.
+
+Layout (all integers are little-endian uint32):
+    header          magic, version, word count, key count, rhyme count
+    word_offsets    word count + 1 offsets into the word table
+    key_ids         sorted ids of the words that have an entry
+    rhyme_offsets   key count + 1 offsets into rhyme_ids
+    rhyme_ids       per-key sorted ids of the rhyming words
+    word table      UTF-8 words, sorted, so a word's id is its rank
+
+Use `MappedRhymeDict` to open a file as a dictionary and
+`write_rhyme_dict` / `convert_csv_to_binary` to create one.
+'''
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from collections.abc import MutableMapping, Sequence
+
+MAGIC = b'RHYMDICT'
+VERSION = 1
+HEADER = struct.Struct('<8sIIII')
+UINT32_SIZE = 4
+
+def is_binary_rhyme_dict(filename):
+    '''
+    Check whether a file is a binary rhyme dictionary.
+    :param filename: the name of the file.
+    :return: True if the file starts with the format's magic bytes.
+    '''
+    with open(filename, 'rb') as rhyme_file:
+        return rhyme_file.read(len(MAGIC)) == MAGIC
+
+def read_csv_rhyme_dict(filename):
+    '''
+    Read a rhyme dictionary in the CSV format written by
+    RhymeLabeler.export_rhyme_dict_to_file.
+    :param filename: the name of the file.
+    :return: a dictionary from words to lists of rhymes.
+    '''
+    rhyme_dict = {}
+    with open(filename, 'r') as rhyme_file:
+        for line in rhyme_file:
+            line = line.rstrip('\n')
+            if line:
+                rhymes = line.split(', ')
+                rhyme_dict[rhymes[0]] = rhymes[1:]
+    return rhyme_dict
+
+def write_rhyme_dict(rhyme_dict, filename):
+    '''
+    Write a rhyme dictionary in the binary format.
+    :param rhyme_dict: a mapping from words to containers of rhymes.
+    :param filename: the file to write to.
+    '''
+    words = set(rhyme_dict)
+    for rhymes in rhyme_dict.values():
+        words.update(rhymes)
+    words = sorted(words)
+    ids = {word: i for i, word in enumerate(words)}
+
+    encoded = [word.encode('utf-8') for word in words]
+    word_offsets = array('I', [0])
+    for word in encoded:
+        word_offsets.append(word_offsets[-1] + len(word))
+
+    key_ids = array('I', sorted(ids[word] for word in rhyme_dict))
+    rhyme_offsets = array('I', [0])
+    rhyme_ids = array('I')
+    for key_id in key_ids:
+        rhyme_ids.extend(sorted(set(ids[rhyme] for rhyme
+                                    in rhyme_dict[words[key_id]])))
+        rhyme_offsets.append(len(rhyme_ids))
+
+    if sys.byteorder != 'little':
+        for table in (word_offsets, key_ids, rhyme_offsets, rhyme_ids):
+            table.byteswap()
+
+    # Write to a temporary file first, so a dictionary that is
+    # currently mapped from filename is never truncated under us.
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as rhyme_file:
+        rhyme_file.write(HEADER.pack(MAGIC, VERSION, len(words),
+                                     len(key_ids), len(rhyme_ids)))
+        for table in (word_offsets, key_ids, rhyme_offsets, rhyme_ids):
+            rhyme_file.write(table.tobytes())
+        for word in encoded:
+            rhyme_file.write(word)
+    os.replace(tmp_filename, filename)
+
+def convert_csv_to_binary(csv_filename, filename):
+    '''
+    Convert a CSV rhyme dictionary to the binary format.
+    :param csv_filename: the CSV file to read.
+    :param filename: the binary file to write.
+    '''
+    write_rhyme_dict(read_csv_rhyme_dict(csv_filename), filename)
+
+class MappedRhymes(Sequence):
+    '''
+    Read-only view of the rhymes of one word in a MappedRhymeDict.
+    Membership tests are binary searches over the sorted ids.
+    '''
+
+    def __init__(self, rhyme_dict, ids):
+        self._rhyme_dict = rhyme_dict
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._rhyme_dict._word(word_id)
+                    for word_id in self._ids[i]]
+        return self._rhyme_dict._word(self._ids[i])
+
+    def __contains__(self, word):
+        word_id = self._rhyme_dict._word_id(word)
+        if word_id is None:
+            return False
+        i = bisect.bisect_left(self._ids, word_id)
+        return i < len(self._ids) and self._ids[i] == word_id
+
+    def __repr__(self):
+        return 'MappedRhymes(%r)' % list(self)
+
+class _WordTable(Sequence):
+    '''
+    Sequence of the encoded words of a MappedRhymeDict, for
+    bisecting without decoding the whole table.
+    '''
+
+    def __init__(self, rhyme_dict):
+        self._rhyme_dict = rhyme_dict
+
+    def __len__(self):
+        return self._rhyme_dict._num_words
+
+    def __getitem__(self, i):
+        return self._rhyme_dict._word_bytes(i)
+
+class MappedRhymeDict(MutableMapping):
+    '''
+    Dictionary view of a binary rhyme dictionary file. Entries are
+    decoded on access from a memory map; words added or removed
+    afterwards (e.g. by an add_rhymes callback) are kept in memory
+    and can be persisted with write_rhyme_dict.
+    '''
+
+    def __init__(self, filename):
+        '''
+        Constructor of a MappedRhymeDict.
+        :param filename: the binary rhyme dictionary to open.
+        '''
+        with open(filename, 'rb') as rhyme_file:
+            self._mmap = mmap.mmap(rhyme_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        magic, version, num_words, num_keys, num_ids = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('%s is not a binary rhyme dictionary.'
+                             % filename)
+        if version != VERSION:
+            raise ValueError('Unsupported rhyme dictionary version %d.'
+                             % version)
+
+        self._num_words = num_words
+        offset = HEADER.size
+        self._word_offsets, offset = self._table(offset, num_words + 1)
+        self._key_ids, offset = self._table(offset, num_keys)
+        self._rhyme_offsets, offset = self._table(offset, num_keys + 1)
+        self._rhyme_ids, offset = self._table(offset, num_ids)
+        self._words_start = offset
+        self._words = _WordTable(self)
+
+        self._added = {}
+        self._removed = set()
+
+    def _table(self, offset, count):
+        end = offset + count * UINT32_SIZE
+        if sys.byteorder == 'little':
+            table = memoryview(self._mmap)[offset:end].cast('I')
+        else:
+            table = array('I', self._mmap[offset:end])
+            table.byteswap()
+        return table, end
+
+    def _word_bytes(self, word_id):
+        start = self._words_start + self._word_offsets[word_id]
+        end = self._words_start + self._word_offsets[word_id + 1]
+        return self._mmap[start:end]
+
+    def _word(self, word_id):
+        return self._word_bytes(word_id).decode('utf-8')
+
+    def _word_id(self, word):
+        if not isinstance(word, str):
+            return None
+        encoded = word.encode('utf-8')
+        i = bisect.bisect_left(self._words, encoded)
+        if i < self._num_words and self._words[i] == encoded:
+            return i
+        return None
+
+    def _stored(self, word):
+        '''
+        Get the file entry of a word, or None if it has none.
+        '''
+        word_id = self._word_id(word)
+        if word_id is None:
+            return None
+        i = bisect.bisect_left(self._key_ids, word_id)
+        if i == len(self._key_ids) or self._key_ids[i] != word_id:
+            return None
+        start, end = self._rhyme_offsets[i], self._rhyme_offsets[i + 1]
+        # Copied, so that no view of the memory map outlives close().
+        return MappedRhymes(self, self._rhyme_ids[start:end].tolist())
+
+    def __getitem__(self, word):
+        if word in self._added:
+            return self._added[word]
+        if word not in self._removed:
+            rhymes = self._stored(word)
+            if rhymes is not None:
+                return rhymes
+        raise KeyError(word)
+
+    def __contains__(self, word):
+        if word in self._added:
+            return True
+        return word not in self._removed and self._stored(word) is not None
+
+    def __setitem__(self, word, rhymes):
+        self._added[word] = rhymes
+
+    def __delitem__(self, word):
+        if word not in self:
+            raise KeyError(word)
+        self._added.pop(word, None)
+        self._removed.add(word)
+
+    def __iter__(self):
+        for key_id in self._key_ids:
+            word = self._word(key_id)
+            if word not in self._added and word not in self._removed:
+                yield word
+        for word in self._added:
+            yield word
+
+    def __len__(self):
+        stored = len(self._key_ids) - sum(
+            1 for word in self._removed if self._stored(word) is not None)
+        return stored + sum(1 for word in self._added
+                            if word in self._removed
+                            or self._stored(word) is None)
+
+    def close(self):
+        '''
+        Release the memory map. Rhymes looked up before may still be
+        referenced, but must not be used afterwards.
+        '''
+        for table in (self._word_offsets, self._key_ids,
+                      self._rhyme_offsets, self._rhyme_ids):
+            if isinstance(table, memoryview):
+                table.release()
+        self._mmap.close()
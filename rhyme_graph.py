@@ -0,0 +1,256 @@
+'''
+Graph of poems linked by the rhyme pairs they share.
+
+Poems are indexed by rhyme pair (an inverted index from each pair of
+rhyming end words to the ids of the poems using it), and the weighted
+adjacency is the sparse co-occurrence count of that index: the weight
+of an edge is the number of distinct rhyme pairs two poems share. The
+adjacency is stored as CSR arrays compatible with scipy.sparse.
+
+Graphs are written to disk as edge lists, GraphML or JSON by
+streaming their edges, without networkx or matplotlib.
+'''
+
+import itertools
+import json
+import os
+
+from xml.sax.saxutils import quoteattr
+
+from rhyme_labeler import get_end_words
+
+DEFAULT_LAYOUT_ITERATIONS = 50
+
+def rhyme_pairs(poem):
+    '''
+    Get the pairs of rhyming end words of a labeled poem.
+    :param poem: a Poem proto with rhyme_sets.
+    :return: the set of pairs, each a sorted tuple of two words.
+    '''
+    words = get_end_words(poem)
+    pairs = set()
+    for rhyme_set in poem.rhyme_sets:
+        for i, j in itertools.combinations(rhyme_set.rhyme_indices, r=2):
+            pairs.add(tuple(sorted((words[i], words[j]))))
+    return pairs
+
+class RhymeGraph(object):
+    '''
+    Weighted, undirected graph of poems in CSR form.
+    '''
+
+    def __init__(self, titles, indptr, indices, data):
+        '''
+        Constructor of a RhymeGraph from symmetric CSR arrays.
+        :param titles: the title of each node.
+        :param indptr: the CSR row pointers.
+        :param indices: the CSR column indices.
+        :param data: the CSR edge weights.
+        '''
+        self.titles = titles
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_poems(cls, poems, min_weight=1, top_k=None):
+        '''
+        Build the graph of labeled poems.
+        :param poems: an iterable of Poem protos with rhyme_sets.
+        :param min_weight: the minimum number of shared rhyme pairs
+        for two poems to be linked.
+        :param top_k: if set, only keep each poem's k heaviest edges
+        (an edge stays if either of its poems keeps it).
+        :return: the RhymeGraph.
+        '''
+        titles = []
+        pair_index = {}
+        for poem_id, poem in enumerate(poems):
+            titles.append(poem.title)
+            for pair in rhyme_pairs(poem):
+                pair_index.setdefault(pair, []).append(poem_id)
+        return cls.from_pair_index(titles, pair_index.values(),
+                                   min_weight, top_k)
+
+    @classmethod
+    def from_pair_index(cls, titles, postings, min_weight=1, top_k=None):
+        '''
+        Build the graph from an inverted index of rhyme pairs.
+        :param titles: the title of each poem id.
+        :param postings: for each rhyme pair, the ids of the distinct
+        poems that use it.
+        :param min_weight: see from_poems.
+        :param top_k: see from_poems.
+        :return: the RhymeGraph.
+        '''
+        import numpy as np
+        from scipy import sparse
+
+        postings = [np.asarray(poem_ids, dtype=np.int64)
+                    for poem_ids in postings]
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(poem_ids) for poem_ids in postings],
+                  out=indptr[1:])
+        indices = (np.concatenate(postings) if postings
+                   else np.zeros(0, dtype=np.int64))
+
+        # Pairs by poems incidence; its Gram matrix counts the pairs
+        # every two poems share.
+        incidence = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr),
+            shape=(len(postings), len(titles)))
+        adjacency = (incidence.T @ incidence).tocsr()
+        adjacency.setdiag(0)
+        if min_weight > 1:
+            adjacency.data[adjacency.data < min_weight] = 0
+        adjacency.eliminate_zeros()
+        if top_k is not None:
+            adjacency = _keep_top_k(adjacency, top_k)
+        adjacency.sort_indices()
+        return cls(list(titles), adjacency.indptr, adjacency.indices,
+                   adjacency.data)
+
+    def num_edges(self):
+        '''
+        :return: the number of undirected edges.
+        '''
+        return len(self.indices) // 2
+
+    def edges(self):
+        '''
+        Iterate over the undirected edges, each once.
+        :return: a generator of (title, title, weight) triples.
+        '''
+        for i in range(len(self.titles)):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            for j, weight in zip(self.indices[start:end].tolist(),
+                                 self.data[start:end].tolist()):
+                if i < j:
+                    yield self.titles[i], self.titles[j], weight
+
+    def to_scipy(self):
+        '''
+        Get the adjacency as a scipy.sparse CSR matrix.
+        '''
+        from scipy import sparse
+
+        return sparse.csr_matrix((self.data, self.indices, self.indptr),
+                                 shape=(len(self.titles), len(self.titles)))
+
+    def to_networkx(self):
+        '''
+        Export the graph to networkx, with the number of shared rhyme
+        pairs as each edge's weight. Like the graphs SequenceStats
+        used to build, poems without edges are left out.
+        '''
+        import networkx as nx
+
+        G = nx.Graph()
+        G.add_weighted_edges_from(self.edges())
+        return G
+
+    # ----------------------- EXPORT ------------------------
+
+    def write(self, filename, format=None):
+        '''
+        Write the graph to a file.
+        :param filename: the file to write.
+        :param format: one of 'edgelist', 'graphml' or 'json'. By
+        default, it is taken from the file extension.
+        '''
+        if format is None:
+            format = os.path.splitext(filename)[1].lstrip('.').lower()
+        writers = {'edgelist': self.write_edgelist,
+                   'graphml': self.write_graphml,
+                   'json': self.write_json}
+        if format not in writers:
+            raise ValueError('Unknown graph format %r, expected one of %s.'
+                             % (format, ', '.join(sorted(writers))))
+        writers[format](filename)
+
+    def write_edgelist(self, filename):
+        '''
+        Write one tab-separated "title, title, weight" line per edge.
+        '''
+        with open(filename, 'w', encoding='utf-8') as graph_file:
+            for title, other_title, weight in self.edges():
+                graph_file.write('%s\t%s\t%d\n'
+                                 % (title, other_title, weight))
+
+    def write_graphml(self, filename):
+        '''
+        Write the graph as GraphML, with every poem as a node and
+        edge weights in a "weight" attribute.
+        '''
+        with open(filename, 'w', encoding='utf-8') as graph_file:
+            graph_file.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                '<key id="weight" for="edge" attr.name="weight" '
+                'attr.type="int"/>\n'
+                '<graph edgedefault="undirected">\n')
+            for title in self.titles:
+                graph_file.write('<node id=%s/>\n' % quoteattr(title))
+            for title, other_title, weight in self.edges():
+                graph_file.write('<edge source=%s target=%s>'
+                                 '<data key="weight">%d</data></edge>\n'
+                                 % (quoteattr(title), quoteattr(other_title),
+                                    weight))
+            graph_file.write('</graph>\n</graphml>\n')
+
+    def write_json(self, filename):
+        '''
+        Write the graph as JSON: {"nodes": [title, ...],
+        "edges": [[title, title, weight], ...]}.
+        '''
+        with open(filename, 'w', encoding='utf-8') as graph_file:
+            graph_file.write('{"nodes": %s, "edges": [' % json.dumps(self.titles))
+            for i, edge in enumerate(self.edges()):
+                graph_file.write((',\n' if i else '\n') + json.dumps(edge))
+            graph_file.write(']}\n')
+
+    def draw(self, filename, iterations=DEFAULT_LAYOUT_ITERATIONS):
+        '''
+        Render the graph to a static image without a display. The
+        spring layout runs for a bounded number of iterations.
+        Requires networkx and matplotlib.
+        :param filename: the image file; its extension selects the
+        format, e.g. .png or .svg.
+        :param iterations: the layout iteration budget.
+        '''
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import networkx as nx
+
+        G = self.to_networkx()
+        positions = nx.spring_layout(G, iterations=iterations, seed=0)
+        figure = plt.figure(figsize=(12, 12))
+        nx.draw_networkx(G, positions, node_size=20, font_size=6,
+                         width=0.2)
+        figure.savefig(filename)
+        plt.close(figure)
+
+def _keep_top_k(adjacency, k):
+    '''
+    Keep the k heaviest edges of every node of a symmetric CSR matrix,
+    keeping an edge if either of its nodes does.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    keep = np.zeros(len(adjacency.data), dtype=bool)
+    for i in range(adjacency.shape[0]):
+        start, end = adjacency.indptr[i], adjacency.indptr[i + 1]
+        if end - start <= k:
+            keep[start:end] = True
+        else:
+            heaviest = np.argsort(-adjacency.data[start:end],
+                                  kind='stable')[:k]
+            keep[start + heaviest] = True
+    kept = sparse.csr_matrix((np.where(keep, adjacency.data, 0),
+                              adjacency.indices, adjacency.indptr),
+                             shape=adjacency.shape)
+    kept = kept.maximum(kept.T).tocsr()
+    kept.eliminate_zeros()
+    return kept
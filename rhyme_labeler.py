@@ -1,6 +1,18 @@
 from proto.Poem_pb2 import *
-
-import networkx as nx
+from disjoint_set import DisjointSet
+from metrics import NULL_METRICS
+from rhyme_dict_file import (MappedRhymeDict, is_binary_rhyme_dict,
+                             read_csv_rhyme_dict, write_rhyme_dict)
+from rhyme_prefetch import fetch_rhymes
+from stanza_templates import STANZA_PATTERNS, label_stanzas
+from util.dataset_utils import NormalizeEndWord
+
+from array import array
+from collections import OrderedDict, namedtuple
+import hashlib
+import itertools
+import threading
+import time
 
 # Rhyme schemes.
 TWO_SCHEMES = [[[0,1]]]
@@ -15,13 +27,56 @@ OCTAVE_LENGTH = 8
 THREE_QUATRAINS_LENGTH = 12
 SONNET_LENGTH = 14
 
+# Poems sent to a label_corpus worker at a time.
+DEFAULT_CHUNKSIZE = 16
+
+# Stanzas whose best scheme is remembered by a labeler.
+DEFAULT_SCHEME_MEMO_SIZE = 65536
+
+# In hybrid labeling, poems whose scheme explains at least this
+# fraction of their lines may skip the group pass. None (exact
+# labeling) runs it on every poem.
+DEFAULT_CONFIDENCE_THRESHOLD = None
+
+# The labeling paths recorded as the label_source of a poem.
+SOURCE_SCHEME = 'scheme'
+SOURCE_GROUP = 'group'
+SOURCE_HYBRID = 'hybrid'
+
+# Part of every label fingerprint; bump it when labeling changes so
+# that incremental runs relabel every poem.
+LABELER_VERSION = 4
+
+'''
+The label of a poem: its sorted rhyme scheme, the confidence of
+its scheme labeling (set by hybrid labeling only) and the labeling
+path that produced it, one of the SOURCE_ names.
+'''
+RhymeLabel = namedtuple('RhymeLabel', ['rhyme_scheme', 'confidence',
+                                       'source'])
+
+def get_end_words(poem):
+    '''
+    Get the normalized last word of every line of a poem, as
+    stored at ingest time. Lines of poems generated before end
+    words were stored are tokenized and normalized here.
+    :param poem: a Poem proto.
+    :return: the list of end words, in order.
+    '''
+    return [entity.line.end_word if entity.line.HasField('end_word')
+            else NormalizeEndWord(entity.line.text.split()[-1])
+            for entity in poem.entity]
+
 class RhymeLabeler(object):
     '''
     Predict the rhymes of poem using a variety of methods,
     and create rhyme dictionaries based on the results.
     '''
 
-    def __init__(self, add_rhymes, rhyme_dict={}, collect_inferred=False):
+    def __init__(self, add_rhymes, rhyme_dict=None, collect_inferred=False,
+                 metrics=NULL_METRICS, stanza_patterns=STANZA_PATTERNS,
+                 scheme_memo_size=DEFAULT_SCHEME_MEMO_SIZE,
+                 confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
         '''
         Constructor of a RhymeCalculator.
         :param add_rhyme: A mutator function to add rhymes
@@ -30,21 +85,56 @@ class RhymeLabeler(object):
         adds the word. No return value.
         :param rhyme_dict: the initial rhyme dictionary
         used for the class. Keys are words, values are rhyme
-        matches in a list.
+        matches in a list (or any other container of words).
+        Defaults to a new empty dictionary; pass a RhymeCache
+        to persist rhymes across runs.
         :param collect_inferred: if set to True, inferred
         rhymes will be added to the dictionary (if they are
         inferred with sufficient confidence).
+        :param metrics: a metrics.Metrics recording the time
+        of each labeling stage and of add_rhymes, and the
+        rhyme dictionary hit rate. Disabled by default.
+        :param stanza_patterns: the stanza_templates.StanzaPatterns
+        that scheme labeling segments poems other than sonnets
+        into.
+        :param scheme_memo_size: the maximum number of stanzas
+        whose best scheme is remembered, so that repeated stanzas
+        are not looked up and scored again. 0 disables the memo.
+        If the rhyme dictionary is changed other than through
+        add_rhymes, call invalidate_rhymes (a RhymeCache does so
+        by itself).
+        :param confidence_threshold: None (the default) compares
+        every pair of lines in hybrid labeling. If set, poems
+        whose scheme labeling has at least this confidence keep
+        their scheme labels without a group pass, and the others
+        are only group labeled on the lines the scheme does not
+        explain. This is faster but approximate: rhymes between
+        lines the scheme explains are estimated from the first
+        line of each group, and may be missed.
         '''
-        self.rhyme_dict = rhyme_dict
+        self.rhyme_dict = {} if rhyme_dict is None else rhyme_dict
         self.collect_inferred = collect_inferred
         self.add_rhymes = add_rhymes
+        self.metrics = metrics
+        self.stanza_patterns = stanza_patterns
+        self.scheme_memo_size = scheme_memo_size
+        self.confidence_threshold = confidence_threshold
+        self._scheme_keys = {}
+        self._scheme_memo = OrderedDict()
+        self._scheme_memo_lock = threading.Lock()
+        self._rhymes_version = getattr(self.rhyme_dict, 'version', None)
+        self.scheme_memo_hits = 0
+        self.scheme_memo_misses = 0
+        self.scheme_memo_evictions = 0
 
     @classmethod
     def from_file(cls, filename, add_rhymes,
-                  collect_inferred=False):
+                  collect_inferred=False, metrics=NULL_METRICS):
         '''
         Constructor of a RhymeCalculator from a rhyme
         dictionary file, rather than a dictionary object.
+        Binary rhyme dictionaries are memory-mapped and read
+        lazily; CSV dictionaries are read into memory.
         :param filename: the name of the file
         :param add_rhymes: A mutator function to add rhymes
         to the rhyme dictionary. Takes in all the words in
@@ -53,28 +143,90 @@ class RhymeLabeler(object):
         :param collect_inferred: if set to True, inferred
         rhymes will be added to the dictionary (if they are
         inferred with sufficient confidence).
+        :param metrics: see the constructor.
         '''
-        rhyme_dict = {}
-        with open(filename, 'r') as rhyme_file:
-            for line in rhyme_file.readlines():
-                if line != '\n':
-                    rhymes = line.split(', ')
-                    rhyme_dict[rhymes[0]] = rhymes[1:]
-        return cls(rhyme_dict, collect_inferred, add_rhymes)
+        if is_binary_rhyme_dict(filename):
+            rhyme_dict = MappedRhymeDict(filename)
+        else:
+            rhyme_dict = read_csv_rhyme_dict(filename)
+        return cls(add_rhymes, rhyme_dict, collect_inferred, metrics)
 
-    def export_rhyme_dict_to_file(self, filename):
+    def export_rhyme_dict_to_file(self, filename, binary=False):
         '''
         Save the rhyme dictionary of this class to a file.
         File format is a csv, with the first column of a row
         referring to the rhyme scheme.
         :param filename: the file to save to.
+        :param binary: if set to True, save in the binary
+        format of rhyme_dict_file instead, which from_file
+        memory-maps.
         '''
+        if binary:
+            write_rhyme_dict(self.rhyme_dict, filename)
+            return
         with open(filename, 'w') as rhyme_file:
             for rhyme in self.rhyme_dict:
                 rhyme_file.write(', '.join([rhyme] +
-                                      self.rhyme_dict[rhyme]))
+                                      list(self.rhyme_dict[rhyme])))
                 rhyme_file.write('\n')
 
+    def prefetch_rhymes(self, poems, **options):
+        '''
+        Look up the rhymes of the end words of many poems
+        concurrently, so that labeling them afterwards runs
+        against a warm rhyme dictionary.
+        :param poems: an iterable of Poem protos, e.g. the
+        poems of a DataLoader.
+        :param options: concurrency, retry and rate limit
+        options of rhyme_prefetch.fetch_rhymes.
+        :return: the list of words that could not be looked up.
+        '''
+        words = set()
+        for poem in poems:
+            words.update(get_end_words(poem))
+        with self.metrics.timer('prefetch_rhymes'):
+            return fetch_rhymes(words, self.add_rhymes, self.rhyme_dict,
+                                **options)
+
+    def _add_rhymes(self, words):
+        '''
+        Add the rhymes of words to the rhyme dictionary,
+        recording the lookups and the time spent.
+        :param words: the words to look up.
+        '''
+        if not self.metrics.enabled:
+            self.add_rhymes(words, self.rhyme_dict)
+            return
+        # Check without side effects where the dictionary allows it,
+        # so that a RhymeCache does not count these checks as hits.
+        has = getattr(self.rhyme_dict, 'has', self.rhyme_dict.__contains__)
+        self.metrics.count('rhyme_dict.lookups', len(words))
+        self.metrics.count('rhyme_dict.misses',
+                           sum(1 for word in words if not has(word)))
+        with self.metrics.timer('add_rhymes'):
+            self.add_rhymes(words, self.rhyme_dict)
+
+    def invalidate_rhymes(self):
+        '''
+        Forget the memoized stanza schemes, after rhyme
+        dictionary entries were changed or removed.
+        '''
+        with self._scheme_memo_lock:
+            self._scheme_memo.clear()
+            self._rhymes_version = getattr(self.rhyme_dict, 'version', None)
+
+    def scheme_memo_stats(self):
+        '''
+        Get the counters of the memo of stanza schemes.
+        :return: a dictionary of hits, misses, evictions, the
+        number of stanzas remembered.
+        '''
+        with self._scheme_memo_lock:
+            return {'hits': self.scheme_memo_hits,
+                    'misses': self.scheme_memo_misses,
+                    'evictions': self.scheme_memo_evictions,
+                    'entries': len(self._scheme_memo)}
+
     # ------------------ SCHEME LABELING -------------------
 
     def _shift_rhyme_scheme(self, scheme, shift_num):
@@ -96,21 +248,65 @@ class RhymeLabeler(object):
     def _pick_rhyme_scheme(self, words, possible_schemes):
         '''
         Helper for scheme labeling to test different scheme
-        divisions and find the best one.
+        divisions and find the best one. The result for
+        each stanza is memoized.
         :param words: a list of the last words of each line
         of the stanza.
         :param possible_schemes: possible rhyme schemes
         for the stanza.
         :return: the best scheme and the best score.
         '''
+        if not self.scheme_memo_size:
+            best, best_score = self._score_rhyme_schemes(words,
+                                                         possible_schemes)
+            return possible_schemes[best], best_score
+        if getattr(self.rhyme_dict, 'version', None) != self._rhymes_version:
+            self.invalidate_rhymes()
+        # Scheme lists are module constants; make each one
+        # hashable once.
+        schemes_key = self._scheme_keys.get(id(possible_schemes))
+        if schemes_key is None or schemes_key[0] is not possible_schemes:
+            schemes_key = (possible_schemes,
+                           tuple(tuple(tuple(pair) for pair in scheme)
+                                 for scheme in possible_schemes))
+            self._scheme_keys[id(possible_schemes)] = schemes_key
+        key = (tuple(words), schemes_key[1])
+        with self._scheme_memo_lock:
+            result = self._scheme_memo.get(key)
+            if result is not None:
+                self._scheme_memo.move_to_end(key)
+                self.scheme_memo_hits += 1
+                return possible_schemes[result[0]], result[1]
+
+        # Only integers are remembered, so that the garbage
+        # collector does not need to track the entries.
+        result = self._score_rhyme_schemes(words, possible_schemes)
+        if getattr(self.rhyme_dict, 'version', None) != self._rhymes_version:
+            # add_rhymes changed existing entries.
+            self.invalidate_rhymes()
+        with self._scheme_memo_lock:
+            self.scheme_memo_misses += 1
+            self._scheme_memo[key] = result
+            while len(self._scheme_memo) > self.scheme_memo_size:
+                self._scheme_memo.popitem(last=False)
+                self.scheme_memo_evictions += 1
+        return possible_schemes[result[0]], result[1]
+
+    def _score_rhyme_schemes(self, words, possible_schemes):
+        '''
+        Helper for scheme labeling: score every possible
+        scheme of a stanza. See _pick_rhyme_scheme.
+        :return: the index of the best scheme and the best
+        score.
+        '''
         best_score = 0
-        best_scheme = possible_schemes[0]
+        best = 0
 
         # Add words to the rhyme dictionary.
-        self.add_rhymes(words, self.rhyme_dict)
+        self._add_rhymes(words)
 
         # Score the rhyme scheme.
-        for scheme in possible_schemes:
+        for i, scheme in enumerate(possible_schemes):
             score = 0
             for pair in scheme:
                 if (words[pair[1]] in self.rhyme_dict[words[pair[0]]]
@@ -119,9 +315,9 @@ class RhymeLabeler(object):
 
             # Check if the best rhyme scheme.
             if score > best_score:
-                best_scheme, best_score = scheme, score
+                best, best_score = i, score
 
-        return best_scheme, best_score
+        return best, best_score
 
     def _label_octave(self, words):
         '''
@@ -166,6 +362,40 @@ class RhymeLabeler(object):
         return self._shift_rhyme_scheme(scheme_sestet,
                                         OCTAVE_LENGTH)
 
+    def _label_stanzas(self, words):
+        '''
+        For scheme labeling of poems that are not sonnets:
+        segment the poem into the stanza patterns that explain
+        the most rhymes (see stanza_templates).
+        :param words: the words of the last lines of the
+        poem, in order.
+        :return: the rhyme scheme.
+        '''
+        self._add_rhymes(words)
+        rhyme_scheme, _ = label_stanzas(words, self._words_rhyme,
+                                        self.stanza_patterns)
+        return rhyme_scheme
+
+    def _words_rhyme(self, word, other_word):
+        return (other_word in self.rhyme_dict[word]
+                or word in self.rhyme_dict[other_word])
+
+    def _label_scheme(self, words):
+        '''
+        Scheme labeling: label a sonnet by its octave and
+        sestet, and any other poem by its stanzas.
+        :param words: the words of the last lines of the
+        poem, in order.
+        :return: the rhyme scheme.
+        '''
+        with self.metrics.timer('label.scheme'):
+            if len(words) != SONNET_LENGTH:
+                return self._label_stanzas(words)
+            # Divide and label the octave and sestet.
+            scheme_octave = self._label_octave(words)
+            scheme_sestet = self._label_sestet(words)
+            return scheme_octave + scheme_sestet
+
     # ------------------- GROUP LABELING -------------------
 
     def _get_rhyme_groups(self, words):
@@ -176,58 +406,182 @@ class RhymeLabeler(object):
         in order.
         :return: rhyme scheme.
         '''
-        # Make graph.
-        G = nx.Graph()
-        G.add_nodes_from(range(len(words)))
+        self._add_rhymes(words)
+        rhymes = [self.rhyme_dict[word] for word in words]
 
-        # Add edges to graph.
-        self.add_rhymes(words, self.rhyme_dict)
+        # Join lines when either end word lists the other as a rhyme.
+        groups = DisjointSet(len(words))
         for i in range(len(words)):
-            word = words[i]
-            for j in range(len(words)):
-                other_word = words[j]
-                if other_word in self.rhyme_dict[word]:
-                    G.add_edge(i, j)
-        return [list(s) for s in list(nx.connected_components(G))]
+            groups.add(i)
+            for j in range(i+1, len(words)):
+                if words[j] in rhymes[i] or words[i] in rhymes[j]:
+                    groups.union(i, j)
+        return groups.groups()
 
     # ------------------ HYBRID LABELING -------------------
 
+    def _explained_lines(self, words, rhyme_scheme, rhyme_groups=None):
+        '''
+        Helper for hybrid labeling. Find the lines whose end
+        rhyme a scheme explains: those whose group of the scheme
+        is exactly their group of rhyming lines.
+        :param words: the words of the last lines of the poem,
+        in order.
+        :param rhyme_scheme: the scheme labels of the poem.
+        :param rhyme_groups: the group labels of the poem, if
+        known. Otherwise a line is taken to be explained when it
+        rhymes with a neighbor in its group, as scored by
+        _pick_rhyme_scheme, and the first line of its group
+        rhymes with no other group's.
+        :return: a list telling whether each line is explained.
+        '''
+        explained = [False] * len(words)
+        if rhyme_groups is not None:
+            scheme_groups = set(map(tuple, map(sorted, rhyme_scheme)))
+            # Groups of _get_rhyme_groups are sorted.
+            for group in rhyme_groups:
+                if len(group) > 1 and tuple(group) in scheme_groups:
+                    for i in group:
+                        explained[i] = True
+            return explained
+        for group in rhyme_scheme:
+            for i, j in zip(group, group[1:]):
+                if self._words_rhyme(words[i], words[j]):
+                    explained[i] = explained[j] = True
+        # e.g. ABBAABBA labeled ABBA CDDC: the A and C groups rhyme.
+        for group, other_group in itertools.combinations(rhyme_scheme, 2):
+            if self._words_rhyme(words[group[0]], words[other_group[0]]):
+                for i in group + other_group:
+                    explained[i] = False
+        return explained
+
+    def _scheme_confidence(self, explained):
+        '''
+        Helper for hybrid labeling: the confidence of scheme
+        labels, the fraction of lines they explain.
+        '''
+        if not explained:
+            return 1.0
+        return sum(explained) / len(explained)
+
+    def _get_unexplained_rhymes(self, words, explained):
+        '''
+        Helper for hybrid labeling. Group labeling restricted to
+        the lines a scheme does not explain: each of them is
+        compared with every other line.
+        :param words: the words of the last lines of the poem,
+        in order.
+        :param explained: see _explained_lines.
+        :return: the rhyming pairs of lines.
+        '''
+        rhymes = [self.rhyme_dict[word] for word in words]
+        pairs = []
+        for i in range(len(words)):
+            if explained[i]:
+                continue
+            for j in range(len(words)):
+                # Pairs of unexplained lines are compared once.
+                if j == i or (j < i and not explained[j]):
+                    continue
+                if words[j] in rhymes[i] or words[i] in rhymes[j]:
+                    pairs.append([i, j])
+        return pairs
+
     def _combine_schemes(self, rhyme_scheme, rhyme_scheme_2):
         '''
         Helper for hybrid labeling. Given two rhyme schemes,
         combine them into one scheme by conglomerating
-        their groups of rhymes.
+        their groups of rhymes. Lines that are alone in their
+        group in both schemes are left out.
         :param rhyme_scheme: the first rhyme scheme.
         :param rhyme_scheme_2: the second rhyme scheme.
         :return: the hybrid rhyme scheme.
         '''
-        G = nx.Graph()
-        for group in rhyme_scheme:
-            for i in range(len(group)):
-                for j in range(i+1, len(group)):
-                    G.add_edge(group[i], group[j])
+        size = 1 + max([i for group in rhyme_scheme + rhyme_scheme_2
+                        for i in group], default=-1)
+        groups = DisjointSet(size)
+        for group in rhyme_scheme + rhyme_scheme_2:
+            for i in group[1:]:
+                groups.union(group[0], i)
+        return groups.groups()
 
-        for group in rhyme_scheme_2:
-            for i in range(len(group)):
-                for j in range(i+1, len(group)):
-                    G.add_edge(group[i], group[j])
+    # ---------------------- PREDICT -----------------------
 
-        return [list(s) for s in list(nx.connected_components(G))]
+    def _label(self, words, scheme, group):
+        '''
+        Label a poem from its end words. See get_rhyme_label
+        for the options.
+        :param words: the words of the last lines of the poem,
+        in order.
+        :return: the RhymeLabel.
+        '''
+        confidence = None
 
-    # ---------------------- PREDICT -----------------------
+        if scheme and not group:
+            rhyme_scheme = self._label_scheme(words)
+            source = SOURCE_SCHEME
+
+        elif group and not scheme:
+            with self.metrics.timer('label.group'):
+                rhyme_scheme = self._get_rhyme_groups(words)
+            source = SOURCE_GROUP
+
+        elif group and scheme:
+            rhyme_scheme_1 = self._label_scheme(words)
+            threshold = self.confidence_threshold
+            if threshold is None:
+                with self.metrics.timer('label.group'):
+                    rhyme_scheme_2 = self._get_rhyme_groups(words)
+                confidence = self._scheme_confidence(self._explained_lines(
+                    words, rhyme_scheme_1, rhyme_scheme_2))
+            else:
+                explained = self._explained_lines(words, rhyme_scheme_1)
+                confidence = self._scheme_confidence(explained)
+                rhyme_scheme_2 = None
+                if confidence < threshold:
+                    with self.metrics.timer('label.group'):
+                        rhyme_scheme_2 = self._get_unexplained_rhymes(
+                            words, explained)
+            if rhyme_scheme_2 is None:
+                self.metrics.count('label.early_exits')
+                rhyme_scheme, source = rhyme_scheme_1, SOURCE_SCHEME
+            else:
+                with self.metrics.timer('label.combine'):
+                    rhyme_scheme = self._combine_schemes(rhyme_scheme_1,
+                                                         rhyme_scheme_2)
+                source = SOURCE_HYBRID
+
+        else:
+            raise ValueError("One rhyming option must be True.")
+
+        return RhymeLabel(sorted([sorted(group) for group in rhyme_scheme],
+                                 key=lambda x: x[0]),
+                          confidence, source)
+
+    def _label_words(self, words, scheme, group):
+        '''
+        Get the rhyme scheme of a poem from its end words.
+        See get_rhyme_scheme for the options.
+        :param words: the words of the last lines of the poem,
+        in order.
+        :return: the sorted rhyme scheme.
+        '''
+        return self._label(words, scheme, group).rhyme_scheme
 
     def get_rhyme_scheme(self, poem, scheme=True, group=True):
-        # TODO(karaschechtman): in hybrid,only accept scheme
-        # labels with a certain level of confidence.
         '''
         Get the rhyme scheme of a poem.
 
         There are three options for how to do this:
         - Scheme: Assign from the best-fitting of a list of
-        common sonnet rhyme schemes.
+        common sonnet rhyme schemes. Poems of other lengths
+        are segmented into common stanza forms instead.
         - Group: Group based on rhymes.
         - Hybrid: Combines the results of scheme and group
-        labeling.
+        labeling. With a confidence_threshold, scheme labels
+        that explain enough of the poem's lines are kept as
+        they are, and otherwise only the lines they do not
+        explain are group labeled.
 
         :param poem: the Poem proto to which to add the
         rhyme groups.
@@ -239,32 +593,259 @@ class RhymeLabeler(object):
         :return: the rhyme scheme, in the form of a list
         of lists. Each list
         '''
-        lines = [entity.line for entity in poem.entity]
-        words = [line.text.split()[-1] for line in lines]
-        rhyme_scheme = []
+        return self._label_words(get_end_words(poem), scheme, group)
 
-        if scheme and not group:
-            if len(words) == SONNET_LENGTH:
-                # Divide and label the octave and sestet.
-                scheme_octave = self._label_octave(words)
-                scheme_sestet = self._label_sestet(words)
-                rhyme_scheme = scheme_octave + scheme_sestet
+    def get_rhyme_label(self, poem, scheme=True, group=True):
+        '''
+        Label a poem, as get_rhyme_scheme does, telling how
+        confident and how its labels are.
+        :param poem: the Poem proto.
+        :param scheme: see get_rhyme_scheme.
+        :param group: see get_rhyme_scheme.
+        :return: the RhymeLabel of the poem.
+        '''
+        return self._label(get_end_words(poem), scheme, group)
 
-        elif group and not scheme:
-            rhyme_scheme = self._get_rhyme_groups(words)
+    def label_fingerprint(self, poem, scheme=True, group=True):
+        '''
+        Get the fingerprint of labeling a poem: a hash of the
+        labeling options, the text of its lines and the rhyme
+        dictionary entries of its end words. The labels of a
+        poem are current if its label_fingerprint matches.
+        :param poem: the Poem proto.
+        :param scheme: see get_rhyme_scheme.
+        :param group: see get_rhyme_scheme.
+        :return: the fingerprint as a hex string.
+        '''
+        words = get_end_words(poem)
+        self._add_rhymes(words)
+        fingerprint = hashlib.blake2b(digest_size=16)
+        threshold = self.confidence_threshold if scheme and group else None
+        fingerprint.update(('%d %d %d %r\n' % (LABELER_VERSION, scheme,
+                                               group, threshold))
+                           .encode('utf-8'))
+        fingerprint.update((repr(self.stanza_patterns) + '\n')
+                           .encode('utf-8'))
+        for entity in poem.entity:
+            fingerprint.update((entity.line.text + '\n').encode('utf-8'))
+        for word in sorted(set(words)):
+            rhymes = sorted(self.rhyme_dict[word])
+            fingerprint.update(('%s: %s\n' % (word, ', '.join(rhymes)))
+                               .encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    def label_corpus(self, poems, scheme=True, group=True, workers=1,
+                     chunksize=DEFAULT_CHUNKSIZE, incremental=False):
+        '''
+        Label many poems, replacing the rhyme_sets of each one
+        with its rhyme scheme, and recording the confidence and
+        source of its RhymeLabel.
+
+        In incremental mode, poems whose label_fingerprint
+        matches are skipped, and the others are labeled and
+        given their new fingerprint. Otherwise every poem is
+        labeled and its fingerprint cleared.
+
+        Scheme labeling alone is vectorized with scheme_matrix
+        when NumPy is available, in this process. Otherwise,
+        with more than one worker, the rhymes of every end word
+        are added to the rhyme dictionary first, and the poems
+        are labeled in a process pool against a read-only
+        snapshot of those entries. The result is the same as
+        labeling the poems one by one.
+
+        :param poems: an iterable of Poem protos.
+        :param scheme: see get_rhyme_scheme.
+        :param group: see get_rhyme_scheme.
+        :param workers: the number of processes to use.
+        :param chunksize: the number of poems sent to a worker
+        at a time.
+        :param incremental: if set to True, only label poems
+        whose labels are not current.
+        :return: the rhyme schemes of the poems, in order.
+        '''
+        if not (scheme or group):
+            raise ValueError("One rhyming option must be True.")
+        poems = list(poems)
+
+        if incremental:
+            fingerprints = [self.label_fingerprint(poem, scheme, group)
+                            for poem in poems]
+            stale = [i for i, poem in enumerate(poems)
+                     if poem.label_fingerprint != fingerprints[i]]
+            rhyme_schemes = [[list(rhyme_set.rhyme_indices)
+                              for rhyme_set in poem.rhyme_sets]
+                             for poem in poems]
+            relabeled = self.label_corpus([poems[i] for i in stale],
+                                          scheme, group, workers, chunksize)
+            for i, rhyme_scheme in zip(stale, relabeled):
+                poems[i].label_fingerprint = fingerprints[i]
+                rhyme_schemes[i] = rhyme_scheme
+            self.metrics.count('label_corpus.skipped', len(poems) - len(stale))
+            return rhyme_schemes
+
+        start = time.perf_counter()
+        word_lists = [get_end_words(poem) for poem in poems]
+
+        scheme_matrix = None
+        if scheme and not group:
+            try:
+                import scheme_matrix
+            except ImportError: # NumPy is optional.
+                pass
+        if scheme_matrix is not None:
+            # Score all sonnets at once; other poems are segmented
+            # into stanzas one by one.
+            words = sorted(set(word for words in word_lists
+                               for word in words))
+            self._add_rhymes(words)
+            sonnets = [i for i, words in enumerate(word_lists)
+                       if len(words) == SONNET_LENGTH]
+            matrices = scheme_matrix.stack_matrices(
+                [word_lists[i] for i in sonnets], self.rhyme_dict)
+            labels = [None if len(words) == SONNET_LENGTH
+                      else self._label(words, scheme, group)
+                      for words in word_lists]
+            for i, rhyme_scheme in zip(
+                    sonnets, scheme_matrix.label_sonnet_schemes(matrices)):
+                # A plain tuple, which is cheaper to create.
+                labels[i] = (rhyme_scheme, None, SOURCE_SCHEME)
+
+        elif workers > 1 and len(poems) > 1:
+            words = sorted(set(word for words in word_lists
+                               for word in words))
+            self._add_rhymes(words)
+            snapshot = {word: frozenset(self.rhyme_dict[word])
+                        for word in words}
+            from concurrent.futures import ProcessPoolExecutor
+
+            initargs = (snapshot, self.stanza_patterns,
+                        self.confidence_threshold)
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_worker,
+                                     initargs=initargs) as executor:
+                results = executor.map(_label_in_worker, word_lists,
+                                       itertools.repeat(scheme),
+                                       itertools.repeat(group),
+                                       chunksize=chunksize)
+                labels = [_unpack_label(*result) for result in results]
+        else:
+            labels = [self._label(words, scheme, group)
+                      for words in word_lists]
+
+        for poem, (rhyme_scheme, confidence, source) in zip(poems, labels):
+            poem.ClearField('label_fingerprint')
+            del poem.rhyme_sets[:]
+            for group_indices in rhyme_scheme:
+                poem.rhyme_sets.add().rhyme_indices.extend(group_indices)
+            if confidence is None:
+                poem.ClearField('label_confidence')
+            else:
+                poem.label_confidence = confidence
+            poem.label_source = source
+        self.metrics.add_time('label_corpus', time.perf_counter() - start)
+        self.metrics.count('label_corpus.poems', len(poems))
+        return [label[0] for label in labels]
+
+    def label_pool(self, workers):
+        '''
+        Create a process pool to label batches of poems in with
+        submit_labels, reusable across any number of corpora.
+        :param workers: the number of processes.
+        :return: a concurrent.futures.ProcessPoolExecutor, to
+        shut down (or use as a context manager) when done.
+        '''
+        from concurrent.futures import ProcessPoolExecutor
 
-        elif group and scheme:
-            rhyme_scheme_1 = []
-            if len(words) == SONNET_LENGTH:
-                scheme_octave = self._label_octave(words)
-                scheme_sestet = self._label_sestet(words)
-                rhyme_scheme_1 = scheme_octave + scheme_sestet
-            rhyme_scheme_2 = self._get_rhyme_groups(words)
-            rhyme_scheme = self._combine_schemes(rhyme_scheme_1,
-                                                 rhyme_scheme_2)
+        return ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker,
+                                   initargs=({}, self.stanza_patterns,
+                                             self.confidence_threshold))
 
-        else:
+    def submit_labels(self, executor, poems, scheme=True, group=True):
+        '''
+        Label a batch of poems in a pool of label_pool, without
+        modifying them. The rhymes of their end words are added
+        to the rhyme dictionary in this process, and sent to the
+        worker along with the poems' end words. The result is
+        the same as labeling the poems one by one.
+        :param executor: the pool.
+        :param poems: an iterable of Poem protos.
+        :param scheme: see get_rhyme_scheme.
+        :param group: see get_rhyme_scheme.
+        :return: a Future of the rhyme schemes of the poems, in
+        order.
+        '''
+        if not (scheme or group):
             raise ValueError("One rhyming option must be True.")
+        word_lists = [get_end_words(poem) for poem in poems]
+        words = sorted(set(word for words in word_lists for word in words))
+        self._add_rhymes(words)
+        snapshot = {word: frozenset(self.rhyme_dict[word]) for word in words}
+        return executor.submit(_label_batch_in_worker, snapshot, word_lists,
+                               scheme, group)
+
+# ------------------- CORPUS WORKERS -------------------
+
+# The labeler of a label_corpus or label_pool worker process.
+_worker_labeler = None
 
-        return sorted([sorted(group) for group in rhyme_scheme],
-                       key=lambda x: x[0])
+def _no_rhymes_to_add(words, rhyme_dict):
+    '''
+    add_rhymes callback of worker labelers, whose rhyme
+    dictionary already holds every word they will see.
+    '''
+    pass
+
+def _init_worker(rhyme_dict, stanza_patterns, confidence_threshold):
+    global _worker_labeler
+    _worker_labeler = RhymeLabeler(_no_rhymes_to_add, rhyme_dict,
+                                   stanza_patterns=stanza_patterns,
+                                   confidence_threshold=confidence_threshold)
+
+def _label_batch_in_worker(rhymes, word_lists, scheme, group):
+    '''
+    Label a batch of submit_labels in a worker process, whose
+    rhyme dictionary keeps the entries of earlier batches.
+    :return: the rhyme schemes.
+    '''
+    rhyme_dict = _worker_labeler.rhyme_dict
+    if any(rhyme_dict.get(word, entry) != entry
+           for word, entry in rhymes.items()):
+        # Entries changed since an earlier batch.
+        _worker_labeler.invalidate_rhymes()
+    rhyme_dict.update(rhymes)
+    return [_worker_labeler._label(words, scheme, group)[0]
+            for words in word_lists]
+
+def _label_in_worker(words, scheme, group):
+    '''
+    Label one poem in a worker process.
+    :return: the rhyme scheme packed as two arrays: the
+    concatenated groups and the length of each group, then
+    the confidence and the source of the label.
+    '''
+    label = _worker_labeler._label(words, scheme, group)
+    rhyme_scheme = label.rhyme_scheme
+    indices = array('I', [i for group in rhyme_scheme for i in group])
+    lengths = array('I', [len(group) for group in rhyme_scheme])
+    return (indices.tobytes(), lengths.tobytes(), label.confidence,
+            label.source)
+
+def _unpack_scheme(indices, lengths):
+    '''
+    Unpack a rhyme scheme packed by _label_in_worker.
+    '''
+    indices = array('I', indices).tolist()
+    rhyme_scheme = []
+    start = 0
+    for length in array('I', lengths):
+        rhyme_scheme.append(indices[start:start + length])
+        start += length
+    return rhyme_scheme
+
+def _unpack_label(indices, lengths, confidence, source):
+    '''
+    Unpack a RhymeLabel returned by _label_in_worker.
+    '''
+    return RhymeLabel(_unpack_scheme(indices, lengths), confidence, source)
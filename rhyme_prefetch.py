@@ -0,0 +1,106 @@
+'''
+Concurrent lookup of the rhymes of many words ahead of labeling.
+
+Any add_rhymes callback can be used: every missing word is looked up
+on its own in a bounded thread pool, with retries and an optional
+rate limit, and the results are merged into the rhyme dictionary from
+the calling thread.
+'''
+
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+class RateLimiter(object):
+    '''
+    Thread-safe limiter spacing out calls to at most a given number
+    per second.
+    '''
+
+    def __init__(self, rate):
+        '''
+        Constructor of a RateLimiter.
+        :param rate: the maximum number of calls per second.
+        '''
+        self._interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        '''
+        Block until the next call is allowed.
+        '''
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+def _fetch(word, add_rhymes, retries, backoff, rate_limiter):
+    '''
+    Look up the rhymes of one word into a private dictionary,
+    retrying with exponential backoff.
+    :return: the word's entries added by add_rhymes.
+    '''
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        rhymes = {}
+        try:
+            add_rhymes([word], rhymes)
+            return rhymes
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+def fetch_rhymes(words, add_rhymes, rhyme_dict, workers=DEFAULT_WORKERS,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 rate_limit=None):
+    '''
+    Add the rhymes of every word missing from a rhyme dictionary,
+    looking them up concurrently.
+    :param words: the words to look up. Duplicates are ignored.
+    :param add_rhymes: the add_rhymes callback of a RhymeLabeler.
+    It is called with one word and a private dictionary at a time,
+    from several threads at once.
+    :param rhyme_dict: the rhyme dictionary to fill.
+    :param workers: the maximum number of concurrent lookups.
+    :param retries: how many times to retry a failed lookup.
+    :param backoff: seconds to wait before the first retry, doubled
+    for every further retry.
+    :param rate_limit: the maximum number of lookups per second,
+    or None for no limit.
+    :return: the list of words whose lookup failed on every attempt.
+    '''
+    missing = [word for word in sorted(set(words))
+               if word not in rhyme_dict]
+    if not missing:
+        return []
+
+    rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+    failed = []
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_fetch, word, add_rhymes, retries,
+                                   backoff, rate_limiter): word
+                   for word in missing}
+        for future in as_completed(futures):
+            try:
+                fetched.update(future.result())
+            except Exception:
+                failed.append(futures[future])
+
+    # Write from this thread only; rhyme dictionaries need not be
+    # thread-safe.
+    if hasattr(rhyme_dict, 'update_many'):
+        rhyme_dict.update_many(fetched)
+    else:
+        rhyme_dict.update(fetched)
+    return sorted(failed)
@@ -0,0 +1,125 @@
+'''
+Vectorized scheme labeling of sonnets with NumPy.
+
+Each poem becomes a boolean rhyme adjacency matrix over its lines, and
+the matrices of many poems are stacked into one (N, 14, 14) array. The
+candidate stanza schemes of RhymeLabeler are compiled into index
+arrays, so every scheme of every poem is scored with a few array
+operations. Labels are the same as RhymeLabeler's scheme mode,
+including its tie-breaking (the first best scheme wins).
+'''
+
+import numpy as np
+
+from rhyme_labeler import (FOUR_SCHEMES, OCTAVE_LENGTH, QUATRAIN_LENGTH,
+                           SIX_SCHEMES, SONNET_LENGTH,
+                           THREE_QUATRAINS_LENGTH, TWO_SCHEMES)
+
+def _compile_schemes(schemes, offset):
+    '''
+    Compile stanza schemes into index arrays into a poem's matrix.
+    :param schemes: the candidate schemes, each a list of pairs.
+    :param offset: the index of the first line of the stanza.
+    :return: the first and second line of every pair, as two
+    (schemes, pairs) arrays.
+    '''
+    pairs = np.array(schemes) + offset
+    return pairs[:, :, 0], pairs[:, :, 1]
+
+# Schemes tried on each stanza by _label_octave and _label_sestet.
+_FIRST_QUATRAIN = _compile_schemes(FOUR_SCHEMES, 0)
+_SECOND_QUATRAIN = _compile_schemes(FOUR_SCHEMES, QUATRAIN_LENGTH)
+_COUPLET = _compile_schemes(TWO_SCHEMES, THREE_QUATRAINS_LENGTH)
+_SESTET = _compile_schemes(SIX_SCHEMES, OCTAVE_LENGTH)
+
+def rhyme_matrix(words, rhyme_dict):
+    '''
+    Get the rhyme adjacency matrix of a poem. Lines rhyme when either
+    end word lists the other as a rhyme.
+    :param words: the words of the last lines of the poem, in order.
+    :param rhyme_dict: a rhyme dictionary holding every word.
+    :return: a symmetric (lines, lines) boolean array.
+    '''
+    rhymes = [rhyme_dict[word] for word in words]
+    matrix = np.array([[other in word_rhymes for other in words]
+                       for word_rhymes in rhymes], dtype=bool)
+    return matrix | matrix.T
+
+def stack_matrices(word_lists, rhyme_dict):
+    '''
+    Stack the rhyme matrices of many sonnets. Words are interned to
+    integer ids, so each rhyme entry is read once for the whole batch
+    and the matrices are filled with a single array lookup.
+    :param word_lists: the end words of each sonnet.
+    :param rhyme_dict: a rhyme dictionary holding every word.
+    :return: an (N, 14, 14) boolean array.
+    '''
+    ids = {}
+    poem_ids = np.array([[ids.setdefault(word, len(ids)) for word in words]
+                         for words in word_lists],
+                        dtype=np.int64).reshape(-1, SONNET_LENGTH)
+
+    # Encode the rhyme relation among the interned words as sorted
+    # pair codes: the code of (i, j) is i * len(ids) + j.
+    codes = []
+    for word, i in ids.items():
+        for rhyme in rhyme_dict[word]:
+            j = ids.get(rhyme)
+            if j is not None:
+                codes.append(i * len(ids) + j)
+    codes = np.unique(np.array(codes, dtype=np.int64))
+
+    pairs = poem_ids[:, :, None] * len(ids) + poem_ids[:, None, :]
+    matrices = np.isin(pairs, codes)
+    return matrices | matrices.transpose(0, 2, 1)
+
+def _score(matrices, compiled):
+    '''
+    Score every scheme of a stanza for every poem.
+    :return: the index of the first best scheme and its score,
+    as two (N,) arrays.
+    '''
+    first, second = compiled
+    scores = matrices[:, first, second].sum(axis=2)
+    return scores.argmax(axis=1), scores.max(axis=1)
+
+def _shift(scheme, shift_num):
+    return [[i + shift_num for i in pair] for pair in scheme]
+
+def _full_scheme(octave, sestet):
+    '''
+    Assemble a sonnet scheme from its quatrain and sestet schemes,
+    sorted as RhymeLabeler.get_rhyme_scheme returns it.
+    '''
+    rhyme_scheme = (octave + _shift(octave, QUATRAIN_LENGTH)
+                    + _shift(sestet, OCTAVE_LENGTH))
+    return sorted([sorted(pair) for pair in rhyme_scheme],
+                  key=lambda x: x[0])
+
+# Every possible labeling, indexed by the octave scheme and then by
+# the sestet: the tercet schemes followed by the quatrain-and-couplet
+# schemes.
+_SESTETS = SIX_SCHEMES + [scheme + [[4,5]] for scheme in FOUR_SCHEMES]
+_FULL_SCHEMES = [[_full_scheme(octave, sestet) for sestet in _SESTETS]
+                 for octave in FOUR_SCHEMES]
+
+def label_sonnet_schemes(matrices):
+    '''
+    Label stacked sonnets with the best-fitting traditional scheme,
+    as RhymeLabeler's scheme mode does.
+    :param matrices: an (N, 14, 14) boolean array of rhyme matrices.
+    :return: the sorted rhyme scheme of each sonnet.
+    '''
+    best_q1, score_q1 = _score(matrices, _FIRST_QUATRAIN)
+    best_q2, score_q2 = _score(matrices, _SECOND_QUATRAIN)
+    # _label_sestet scores its quatrain on a slice starting at the
+    # second quatrain, so that score is reused for the third.
+    best_q3, score_q3 = best_q2, score_q2
+    best_c, score_c = _score(matrices, _COUPLET)
+    best_s, score_s = _score(matrices, _SESTET)
+
+    octave = np.where(score_q1 > score_q2, best_q1, best_q2)
+    sestet = np.where(score_s > score_q3 + score_c, best_s,
+                      len(SIX_SCHEMES) + best_q3)
+    return [[pair[:] for pair in _FULL_SCHEMES[o][s]]
+            for o, s in zip(octave.tolist(), sestet.tolist())]
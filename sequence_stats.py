@@ -1,47 +1,54 @@
-from collections import defaultdict
 from data_loader import DataLoader
+from rhyme_graph import DEFAULT_LAYOUT_ITERATIONS, RhymeGraph
 from rhyme_labeler import RhymeLabeler
-from proto.Poem_pb2 import *
-
-import itertools
-import matplotlib.pyplot as plt
-import networkx as nx
 
 class SequenceStats(object):
 
-    def __init__(self, title, data, rhyme_labeler):
+    def __init__(self, title, data, rhyme_labeler, workers=1,
+                 incremental=True, end_word_index=None):
         self.title = title
         self.data = data
         self.rhyme_labeler = rhyme_labeler
+        self.workers = workers
+        self.incremental = incremental
+        self.end_word_index = end_word_index
 
     def _label_rhymes(self):
-        for poem in self.data.poems.values():
-            scheme = self.rhyme_labeler.get_rhyme_scheme(poem)
-            for group in scheme:
-                set = RhymeSet()
-                set.rhyme_indices.extend(group)
-                poem.rhyme_sets.add().CopyFrom(set)
-
-    def _construct_graph(self):
-        matches = defaultdict(list)
-        for poem in self.data.poems.values():
-            lines = [entity.line for entity in poem.entity]
-            words = [line.text.split()[-1] for line in lines]
-            for set in poem.rhyme_sets:
-                for pair in itertools.combinations(set.rhyme_indices, r=2):
-                    rhyme_pair = tuple(sorted((words[pair[0]], words[pair[1]])))
-                    matches[rhyme_pair].append(poem.title)
+        # Poems are labeled while cached, so that changes to poems
+        # evicted afterwards are kept for write().
+        for poems in self.data.iter_chunks():
+            self.rhyme_labeler.label_corpus(poems, workers=self.workers,
+                                            incremental=self.incremental)
 
-        G = nx.Graph()
-        for rhyme_pair in matches:
-            poems = matches[rhyme_pair]
-            for pair in itertools.combinations(poems, r=2):
-                G.add_edge(*pair)
-        return G
+    def _construct_graph(self, min_weight=1, top_k=None):
+        if self.end_word_index is not None:
+            self.end_word_index.index_corpus(self.title, self.data)
+            return self.end_word_index.rhyme_graph([self.title],
+                                                   min_weight, top_k)
+        return RhymeGraph.from_poems(self.data.poems.values(),
+                                     min_weight=min_weight, top_k=top_k)
 
-    def build(self):
+    def build(self, output=None, format=None, image=None,
+              layout_iterations=DEFAULT_LAYOUT_ITERATIONS,
+              min_weight=1, top_k=None):
+        '''
+        Label the sequence, save the labels and build its graph of
+        poems sharing rhyme pairs. Nothing is displayed.
+        :param output: if set, the file to write the graph to.
+        :param format: the format of output, see RhymeGraph.write.
+        :param image: if set, the file to render the graph to.
+        Requires networkx and matplotlib.
+        :param layout_iterations: the layout iteration budget of
+        the rendered image.
+        :param min_weight: see RhymeGraph.from_poems.
+        :param top_k: see RhymeGraph.from_poems.
+        :return: the RhymeGraph.
+        '''
         self._label_rhymes()
         self.data.write()
-        G = self._construct_graph()
-        nx.draw_networkx(G)
-        plt.show()
+        graph = self._construct_graph(min_weight, top_k)
+        if output is not None:
+            graph.write(output, format)
+        if image is not None:
+            graph.draw(image, layout_iterations)
+        return graph
@@ -0,0 +1,286 @@
+'''
+Command line entry point of the sonnet-analysis tools:
+
+    python3 sonnet_analysis.py ingest --shakespeare --verbose
+    python3 sonnet_analysis.py label data/shakespeare_sonnets/
+    python3 sonnet_analysis.py stats data/shakespeare_sonnets/
+    python3 sonnet_analysis.py graph data/shakespeare_sonnets/ -o graph.graphml
+    python3 sonnet_analysis.py export data/shakespeare_sonnets/ data/col/
+    python3 sonnet_analysis.py index data/index.db data/shakespeare_sonnets/
+    python3 sonnet_analysis.py query data/index.db love prove
+
+Corpora are directories of poem files or packed corpus files. Every
+subcommand imports what it needs only when it runs, so --help and
+light subcommands start quickly (see benchmarks/startup.py).
+'''
+
+import argparse
+
+PROG = 'sonnet-analysis'
+MODES = {'scheme': (True, False), 'group': (False, True),
+         'hybrid': (True, True)}
+DEFAULT_PREFETCH_WORKERS = 8
+EXPORT_FORMATS = ['columnar', 'packed', 'directory']
+# rhyme_labeler.DEFAULT_CONFIDENCE_THRESHOLD, which is not imported
+# so that --help starts quickly.
+DEFAULT_CONFIDENCE_THRESHOLD = None
+
+def _make_labeler(args, metrics=None):
+    '''
+    Create the RhymeLabeler of the labeler options.
+    '''
+    from metrics import NULL_METRICS
+    from rhyme_labeler import RhymeLabeler
+
+    metrics = NULL_METRICS if metrics is None else metrics
+    if args.cmudict:
+        from phonetic_rhymes import PhoneticRhymes
+        add_rhymes = PhoneticRhymes.from_file(args.cmudict).add_rhymes
+    else:
+        from datamuse_rhymes import DatamuseRhymes
+        add_rhymes = DatamuseRhymes(metrics=metrics).add_rhymes
+    if args.rhyme_dict:
+        rhyme_labeler = RhymeLabeler.from_file(args.rhyme_dict, add_rhymes,
+                                               metrics=metrics)
+        rhyme_labeler.confidence_threshold = args.confidence_threshold
+        return rhyme_labeler
+    rhyme_dict = None
+    if args.rhyme_cache:
+        from rhyme_cache import RhymeCache
+        rhyme_dict = RhymeCache(args.rhyme_cache)
+    return RhymeLabeler(add_rhymes, rhyme_dict, metrics=metrics,
+                        confidence_threshold=args.confidence_threshold)
+
+def _confidence_threshold(value):
+    return None if value == 'none' else float(value)
+
+def _add_labeler_arguments(parser):
+    parser.add_argument('--mode', choices=sorted(MODES), default='hybrid',
+                        help='Labeling mode (default: hybrid).')
+    parser.add_argument('--cmudict',
+                        help='Look up rhymes in this pronunciation file '
+                             'instead of Datamuse.')
+    parser.add_argument('--rhyme-dict',
+                        help='Rhyme dictionary file (CSV or binary) to '
+                             'start from.')
+    parser.add_argument('--rhyme-cache',
+                        help='RhymeCache database keeping rhymes between '
+                             'runs.')
+    parser.add_argument('--confidence-threshold', type=_confidence_threshold,
+                        default=DEFAULT_CONFIDENCE_THRESHOLD,
+                        help='Hybrid mode: skip the group pass of poems '
+                             'whose scheme explains this fraction of '
+                             'lines, approximately, or "none" to compare '
+                             'every pair of lines (default: none).')
+
+def _named_corpora(corpora):
+    '''
+    :return: an OrderedDict from names to paths of "name=path" or
+    "path" arguments.
+    '''
+    from collections import OrderedDict
+
+    return OrderedDict(corpus.split('=', 1) if '=' in corpus
+                       else (corpus, corpus) for corpus in corpora)
+
+def ingest(args):
+    import generate_dataset
+    generate_dataset.main(args.options)
+
+def label(args):
+    from data_loader import DataLoader
+
+    rhyme_labeler = _make_labeler(args)
+    scheme, group = MODES[args.mode]
+    for corpus in args.corpora:
+        data = DataLoader(corpus)
+        for poems in data.iter_chunks():
+            rhyme_labeler.label_corpus(poems, scheme, group,
+                                       workers=args.workers,
+                                       incremental=not args.force)
+        written = data.write()
+        print('%s: %d poems, %d relabeled' % (corpus, len(data.poems),
+                                                len(written)))
+
+def stats(args):
+    from corpus_stats import corpus_report, write_report
+    from metrics import Metrics
+
+    metrics = Metrics(enabled=args.metrics is not None)
+    rhyme_labeler = _make_labeler(args, metrics)
+    scheme, group = MODES[args.mode]
+    report = corpus_report(_named_corpora(args.corpora), rhyme_labeler,
+                           scheme, group, workers=args.workers,
+                           prefetch={'workers': args.prefetch_workers},
+                           metrics=metrics)
+    for name, sequence in report['sequences'].items():
+        print('%s: %d groups, average size %s, largest %s, stdev %s'
+              % (name, sequence['groups'], sequence['average'],
+                 sequence['largest'], sequence['stdev']))
+    if args.report:
+        write_report(report, args.report)
+    if args.metrics:
+        metrics.set_value('scheme_memo', rhyme_labeler.scheme_memo_stats())
+        metrics.dump(args.metrics)
+
+def graph(args):
+    from data_loader import DataLoader
+    from rhyme_graph import RhymeGraph
+
+    poems = (poem for corpus in args.corpora
+             for poem in DataLoader(corpus).iter_poems())
+    rhyme_graph = RhymeGraph.from_poems(poems, args.min_weight, args.top_k)
+    if args.output:
+        rhyme_graph.write(args.output, args.format)
+    if args.image:
+        options = {}
+        if args.layout_iterations is not None:
+            options['iterations'] = args.layout_iterations
+        rhyme_graph.draw(args.image, **options)
+    print('%d poems, %d edges' % (len(rhyme_graph.titles),
+                                  rhyme_graph.num_edges()))
+
+def export(args):
+    import os
+    from data_loader import DataLoader
+
+    poems = DataLoader(args.corpus).iter_poems()
+    if args.format == 'columnar':
+        from columnar_corpus import export_columnar
+        export_columnar(poems, args.output)
+    elif args.format == 'packed':
+        from packed_corpus import write_packed
+        write_packed(poems, args.output)
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        data = DataLoader(args.output)
+        for poem in poems:
+            data.poems[poem.title] = poem
+        data.write()
+
+def index(args):
+    from data_loader import DataLoader
+    from end_word_index import EndWordIndex
+
+    end_word_index = EndWordIndex(args.index)
+    for name, corpus in _named_corpora(args.corpora).items():
+        updated = end_word_index.index_corpus(name, DataLoader(corpus))
+        print('%s: %d poems reindexed' % (name, updated))
+    end_word_index.close()
+
+def query(args):
+    from end_word_index import EndWordIndex
+
+    end_word_index = EndWordIndex(args.index)
+    if args.other_word:
+        for sequence, title in end_word_index.poems_rhyming(
+                args.word, args.other_word):
+            print('%s\t%s' % (sequence, title))
+    else:
+        for sequence, title, line_index in end_word_index.lines_ending_with(
+                args.word):
+            print('%s\t%s\t%d' % (sequence, title, line_index))
+        for other_word, poems in end_word_index.rhymes_of(args.word):
+            print('rhymes with %s in %d poems' % (other_word, poems))
+    end_word_index.close()
+
+def make_parser():
+    '''
+    :return: the argparse parser of every subcommand.
+    '''
+    parser = argparse.ArgumentParser(
+        prog=PROG, description='Label and analyze the rhymes of sonnet '
+                               'sequences.')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    parser_ingest = subparsers.add_parser(
+        'ingest', add_help=False,
+        help='Scrape sonnet sequences into poem files; takes the '
+             'options of generate_dataset.py (see "ingest --help").')
+    parser_ingest.set_defaults(run=ingest)
+
+    parser_label = subparsers.add_parser(
+        'label', help='Label the rhymes of corpora and save them.')
+    parser_label.add_argument('corpora', nargs='+', metavar='corpus')
+    _add_labeler_arguments(parser_label)
+    parser_label.add_argument('--workers', type=int, default=1,
+                              help='Processes to label with.')
+    parser_label.add_argument('--force', action='store_true',
+                              help='Relabel poems whose labels are '
+                                   'current.')
+    parser_label.set_defaults(run=label)
+
+    parser_stats = subparsers.add_parser(
+        'stats', help='Print rhyme group size statistics of corpora.')
+    parser_stats.add_argument('corpora', nargs='+', metavar='[name=]corpus')
+    _add_labeler_arguments(parser_stats)
+    parser_stats.add_argument('--workers', type=int, default=1,
+                              help='Processes to label with.')
+    parser_stats.add_argument('--prefetch-workers', type=int,
+                              default=DEFAULT_PREFETCH_WORKERS,
+                              help='Concurrent rhyme lookups.')
+    parser_stats.add_argument('--report',
+                              help='Also save the statistics as JSON.')
+    parser_stats.add_argument('--metrics',
+                              help='Save timings and counters as JSON.')
+    parser_stats.set_defaults(run=stats)
+
+    parser_graph = subparsers.add_parser(
+        'graph', help='Build the graph of labeled poems sharing rhyme '
+                      'pairs.')
+    parser_graph.add_argument('corpora', nargs='+', metavar='corpus')
+    parser_graph.add_argument('-o', '--output',
+                              help='File to write the graph to.')
+    parser_graph.add_argument('--format',
+                              choices=['edgelist', 'graphml', 'json'],
+                              help='Format of the output (default: from '
+                                   'its extension).')
+    parser_graph.add_argument('--image',
+                              help='File to render the graph to.')
+    parser_graph.add_argument('--layout-iterations', type=int,
+                              help='Layout iterations of the image.')
+    parser_graph.add_argument('--min-weight', type=int, default=1,
+                              help='Fewest shared rhyme pairs of an edge.')
+    parser_graph.add_argument('--top-k', type=int,
+                              help='Heaviest edges to keep per poem.')
+    parser_graph.set_defaults(run=graph)
+
+    parser_export = subparsers.add_parser(
+        'export', help='Convert a corpus to another format.')
+    parser_export.add_argument('corpus')
+    parser_export.add_argument('output')
+    parser_export.add_argument('--format', choices=EXPORT_FORMATS,
+                               default='columnar',
+                               help='Format of the output (default: '
+                                    'columnar).')
+    parser_export.set_defaults(run=export)
+
+    parser_index = subparsers.add_parser(
+        'index', help='Index the end words and rhyme pairs of labeled '
+                      'corpora.')
+    parser_index.add_argument('index', help='The index database.')
+    parser_index.add_argument('corpora', nargs='+', metavar='[name=]corpus')
+    parser_index.set_defaults(run=index)
+
+    parser_query = subparsers.add_parser(
+        'query', help='List the lines ending with a word and its rhymes, '
+                      'or the poems rhyming two words.')
+    parser_query.add_argument('index', help='The index database.')
+    parser_query.add_argument('word')
+    parser_query.add_argument('other_word', nargs='?')
+    parser_query.set_defaults(run=query)
+    return parser
+
+def main(argv=None):
+    parser = make_parser()
+    # The options of ingest, --help included, are generate_dataset's.
+    args, options = parser.parse_known_args(argv)
+    if args.command == 'ingest':
+        args.options = options
+    elif options:
+        parser.error('unrecognized arguments: %s' % ' '.join(options))
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+'''
+Template-driven scheme labeling of poems of any length.
+
+Stanza forms are declared as data: a StanzaPattern has a length and
+candidate schemes, each a list of groups of line indices within the
+stanza. A poem is labeled by the segmentation of its lines into
+stanzas that explains the most rhymes, found by dynamic programming
+over the end of the last stanza. The score of a stanza under a pattern
+is computed once per (start, pattern) and memoized, so labeling takes
+time linear in the number of lines times the number of patterns.
+
+A group scores one point per consecutive pair of its lines that
+rhyme; for groups of two this is the scoring of
+RhymeLabeler._pick_rhyme_scheme. Lines of stanzas that explain no
+rhyme are left unlabeled.
+'''
+
+from collections import namedtuple
+
+'''
+A stanza form: its name, number of lines and candidate schemes.
+'''
+StanzaPattern = namedtuple('StanzaPattern', ['name', 'length', 'schemes'])
+
+STANZA_PATTERNS = [
+    StanzaPattern('couplet', 2, [[[0,1]]]),
+    StanzaPattern('tercet', 3, [[[0,2]], [[0,1]], [[1,2]]]),
+    StanzaPattern('quatrain', 4, [[[0,3],[1,2]], [[0,2],[1,3]],
+                                  [[0,1],[2,3]]]),
+    StanzaPattern('quintain', 5, [[[0,2],[1,3,4]], [[0,1,4],[2,3]]]),
+    StanzaPattern('sestet', 6, [[[0,3],[1,4],[2,5]], [[0,1],[2,5],[3,4]],
+                                [[0,2],[1,3],[4,5]]]),
+    StanzaPattern('rhyme_royal', 7, [[[0,2],[1,3,4],[5,6]]]),
+    StanzaPattern('ottava_rima', 8, [[[0,2,4],[1,3,5],[6,7]]]),
+    StanzaPattern('spenserian', 9, [[[0,2],[1,3,4,6],[5,7,8]]]),
+]
+
+def _score_scheme(words, start, scheme, do_rhyme):
+    score = 0
+    for group in scheme:
+        for i, j in zip(group, group[1:]):
+            if do_rhyme(words[start + i], words[start + j]):
+                score += 1
+    return score
+
+def label_stanzas(words, do_rhyme, patterns=STANZA_PATTERNS):
+    '''
+    Label the scheme of a poem by segmenting it into stanzas.
+    :param words: the words of the last lines of the poem, in order.
+    :param do_rhyme: a function telling whether two words rhyme.
+    :param patterns: the StanzaPatterns to segment the poem into.
+    :return: the rhyme scheme, a list of groups of line indices, and
+    its score. Of the best-scoring segmentations, the one with the
+    fewest stanzas wins, then the one using earlier patterns and
+    schemes.
+    '''
+    memo = {}
+    def segment(start, pattern):
+        '''
+        :return: the best scheme of a pattern at a line, and its score.
+        '''
+        key = (start, pattern.name)
+        if key not in memo:
+            best_scheme, best_score = None, 0
+            for scheme in pattern.schemes:
+                score = _score_scheme(words, start, scheme, do_rhyme)
+                if score > best_score:
+                    best_scheme, best_score = scheme, score
+            memo[key] = best_scheme, best_score
+        return memo[key]
+
+    # best[i]: the (score, -stanzas) of the best segmentation of the
+    # first i lines, and the start and scheme of its last stanza (no
+    # scheme when its last line is left unlabeled).
+    best = [((0, 0), None, None)]
+    for end in range(1, len(words) + 1):
+        (score, stanzas), _, _ = best[end - 1]
+        candidate = ((score, stanzas), end - 1, None)
+        for pattern in patterns:
+            start = end - pattern.length
+            if start < 0:
+                continue
+            scheme, segment_score = segment(start, pattern)
+            if scheme is None:
+                continue
+            (score, stanzas), _, _ = best[start]
+            value = (score + segment_score, stanzas - 1)
+            if value > candidate[0]:
+                candidate = (value, start, scheme)
+        best.append(candidate)
+
+    rhyme_scheme = []
+    end = len(words)
+    while end > 0:
+        _, start, scheme = best[end]
+        if scheme is not None:
+            rhyme_scheme.extend([start + i for i in group]
+                                for group in scheme)
+        end = start
+    return sorted(rhyme_scheme, key=lambda group: group[0]), best[-1][0][0]
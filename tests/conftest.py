@@ -0,0 +1,9 @@
+'''
+Puts the modules of the repository on the path of the tests, which are
+run from the repository with `python -m pytest tests/`.
+'''
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
@@ -0,0 +1,97 @@
+'''
+Tests of the dirty-tracking write-back of DataLoader with a bounded
+cache, for directory and packed corpora.
+'''
+import os
+
+import pytest
+
+from data_loader import DataLoader
+from packed_corpus import write_packed
+from proto.Poem_pb2 import Poem
+
+NUM_POEMS = 20
+CACHE_SIZE = 3
+
+def make_poems():
+    poems = []
+    for i in range(NUM_POEMS):
+        poem = Poem()
+        poem.title = 'poem%02d' % i
+        poem.author = 'author'
+        poem.entity.add().line.text = 'a line'
+        poems.append(poem)
+    return poems
+
+@pytest.fixture(params=['directory', 'packed'])
+def corpus(request, tmp_path):
+    if request.param == 'packed':
+        path = str(tmp_path / 'corpus.pack')
+        write_packed(make_poems(), path)
+        return path
+    data = DataLoader(str(tmp_path))
+    for poem in make_poems():
+        data.poems[poem.title] = poem
+    data.write()
+    return str(tmp_path)
+
+def authors(path):
+    return {poem.title: poem.author for poem in DataLoader(path).iter_poems()}
+
+def test_unmodified_poems_are_not_written(corpus):
+    data = DataLoader(corpus, cache_size=CACHE_SIZE)
+    for poem in data.iter_poems():
+        pass
+    for title in list(data.poems):
+        data.poems[title]
+    assert data.write() == []
+
+def test_modified_poems_are_written_and_cache_stays_bounded(corpus):
+    data = DataLoader(corpus, cache_size=CACHE_SIZE)
+    # Modified poems are evicted before the write, and kept for it.
+    for title in list(data.poems):
+        data.poems[title].author = 'changed'
+    assert sorted(data.write()) == sorted(data.poems)
+    assert len(data.poems.loaded()) <= CACHE_SIZE
+    assert set(authors(corpus).values()) == {'changed'}
+    assert data.write() == []
+
+def test_chunks_are_written(corpus):
+    data = DataLoader(corpus, cache_size=CACHE_SIZE)
+    for poems in data.iter_chunks():
+        assert len(poems) <= CACHE_SIZE
+        for poem in poems:
+            poem.author = 'chunked'
+    assert len(data.write()) == NUM_POEMS
+    assert set(authors(corpus).values()) == {'chunked'}
+
+def test_poems_read_again_after_a_write_are_tracked(corpus):
+    data = DataLoader(corpus, cache_size=CACHE_SIZE)
+    for title in list(data.poems):
+        data.poems[title].author = 'first'
+    data.write()
+    title = next(iter(data.poems))
+    data.poems[title].author = 'second'
+    assert data.write() == [title]
+    assert authors(corpus)[title] == 'second'
+
+def test_only_modified_files_are_replaced(tmp_path):
+    data = DataLoader(str(tmp_path))
+    for poem in make_poems():
+        data.poems[poem.title] = poem
+    data.write()
+    files = {title: os.stat(str(tmp_path / (title + '.txt'))).st_ino
+             for title in data.poems}
+    data = DataLoader(str(tmp_path), cache_size=CACHE_SIZE)
+    data.poems['poem05'].author = 'changed'
+    assert data.write() == ['poem05']
+    for title, inode in files.items():
+        replaced = os.stat(str(tmp_path / (title + '.txt'))).st_ino != inode
+        assert replaced == (title == 'poem05')
+    assert not [name for name in os.listdir(str(tmp_path))
+                if name.endswith('.tmp')]
+
+def test_marked_poems_are_written(corpus):
+    data = DataLoader(corpus, cache_size=CACHE_SIZE)
+    data.mark_dirty('poem00')
+    assert data.write() == ['poem00']
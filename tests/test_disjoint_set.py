@@ -0,0 +1,31 @@
+'''
+Tests of the union-find used to group rhyming lines.
+'''
+import random
+
+from disjoint_set import DisjointSet
+
+def test_groups_only_members():
+    sets = DisjointSet(6)
+    sets.union(0, 2)
+    sets.union(4, 2)
+    sets.add(5)
+    assert sorted(sets.groups()) == [[0, 2, 4], [5]]
+    assert sets.find(0) == sets.find(4)
+    assert sets.find(1) == 1
+
+def test_matches_connected_components():
+    import networkx as nx
+
+    rng = random.Random(3)
+    for _ in range(50):
+        size = rng.randint(1, 20)
+        sets = DisjointSet(size)
+        G = nx.Graph()
+        for _ in range(rng.randint(0, size)):
+            i, j = rng.randrange(size), rng.randrange(size)
+            sets.union(i, j)
+            G.add_edge(i, j)
+        expected = sorted(sorted(component)
+                          for component in nx.connected_components(G))
+        assert sorted(sets.groups()) == expected
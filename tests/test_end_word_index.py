@@ -0,0 +1,83 @@
+'''
+Tests of the inverted index of end words and rhyme pairs.
+'''
+import os
+
+import pytest
+
+from data_loader import DataLoader
+from end_word_index import EndWordIndex
+from proto.Poem_pb2 import Poem
+from rhyme_graph import RhymeGraph
+
+def make_poem(title, words, rhyme_scheme):
+    poem = Poem()
+    poem.title = title
+    for i, word in enumerate(words):
+        line = poem.entity.add().line
+        line.text = 'a line ending in ' + word
+        line.index = i
+        line.end_word = word
+    for group in rhyme_scheme:
+        poem.rhyme_sets.add().rhyme_indices.extend(group)
+    return poem
+
+POEMS = [
+    make_poem('1', ['day', 'night', 'way', 'light'], [[0, 2], [1, 3]]),
+    make_poem('2', ['day', 'love', 'way', 'dove'], [[0, 2], [1, 3]]),
+    make_poem('3', ['love', 'love', 'prove', 'sea'], [[0, 1, 2]]),
+]
+
+@pytest.fixture
+def index(tmp_path):
+    index = EndWordIndex(str(tmp_path / 'index.sqlite'))
+    yield index
+    index.close()
+
+def test_queries(index):
+    assert index.update('A', POEMS) == 3
+    assert index.update('A', POEMS) == 0
+    assert index.lines_ending_with('love') == [('A', '2', 1), ('A', '3', 0),
+                                               ('A', '3', 1)]
+    assert index.poems_rhyming('way', 'day') == [('A', '1'), ('A', '2')]
+    # Poem 3 rhymes love with itself, and is counted once.
+    assert index.rhymes_of('love') == [('dove', 1), ('love', 1),
+                                       ('prove', 1)]
+    assert index.lines_rhyming_with('day') == [('A', '1', 2, 'way'),
+                                               ('A', '2', 2, 'way')]
+
+def test_relabeled_poems_are_reindexed(index):
+    index.update('A', POEMS)
+    poem = Poem()
+    poem.CopyFrom(POEMS[0])
+    del poem.rhyme_sets[1]
+    assert index.update_poem('A', poem)
+    assert index.poems_rhyming('night', 'light') == []
+    assert index.titles('A') == ['1', '2', '3']
+
+def test_index_corpus_removes_poems(index, tmp_path):
+    dir = tmp_path / 'sequence'
+    dir.mkdir()
+    for poem in POEMS:
+        (dir / (poem.title + '.txt')).write_bytes(poem.SerializeToString())
+    assert index.index_corpus('A', DataLoader(str(dir))) == 3
+    os.remove(str(dir / '2.txt'))
+    assert index.index_corpus('A', DataLoader(str(dir))) == 0
+    assert index.titles('A') == ['1', '3']
+    assert index.poems_rhyming('love', 'dove') == []
+
+@pytest.mark.parametrize('min_weight, top_k', [(1, None), (1, 1), (2, None)])
+def test_rhyme_graph_matches_from_poems(index, min_weight, top_k):
+    index.update('A', POEMS)
+    expected = RhymeGraph.from_poems(POEMS, min_weight, top_k)
+    graph = index.rhyme_graph(min_weight=min_weight, top_k=top_k)
+    assert graph.titles == expected.titles
+    assert sorted(graph.edges()) == sorted(expected.edges())
+    assert graph.num_edges() == (min_weight == 1)
+
+def test_sequences_are_prefixed(index):
+    index.update('A', POEMS[:2])
+    index.update('B', POEMS[2:])
+    assert index.sequences() == ['A', 'B']
+    assert index.rhyme_graph().titles == ['A/1', 'A/2', 'B/3']
+    assert index.rhyme_graph(['B']).titles == ['3']
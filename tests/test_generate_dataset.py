@@ -0,0 +1,65 @@
+'''
+Offline tests of the scraping pipeline, against the saved pages of
+fixtures/pages.
+'''
+import json
+import os
+import pathlib
+import sys
+
+import pytest
+
+import generate_dataset
+from data_loader import DataLoader
+from util.fetch_utils import FetchPages, PageCache
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     'fixtures', 'pages')
+BASE_URL = pathlib.Path(PAGES).as_uri()
+SONNET_URL = generate_dataset.SHAKESPEARE_URL + 'I' + generate_dataset.HTML
+
+def test_fetch_pages_from_fixture_directory(tmp_path):
+    cache = PageCache(str(tmp_path))
+    pages = FetchPages([SONNET_URL], cache, base_url=BASE_URL)
+    with open(os.path.join(PAGES, 'Poetry', 'sonnet.I.html'), 'rb') as page:
+        assert pages == {SONNET_URL: page.read()}
+    # Cached under the original URL.
+    assert FetchPages([SONNET_URL], cache, offline=True) == pages
+
+def test_offline_fetch_of_uncached_page_fails(tmp_path):
+    with pytest.raises(IOError):
+        FetchPages([SONNET_URL], PageCache(str(tmp_path)), offline=True)
+
+def generate(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['generate_dataset.py'] + list(args))
+    generate_dataset.main()
+
+def test_ingest_from_fixture_directory_and_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(generate_dataset, 'NUM_SHAKESPEARE_POEMS', 2)
+    generate(monkeypatch, '--shakespeare', '--sidney', '--base-url', BASE_URL)
+
+    shakespeare = DataLoader(generate_dataset.SHAKESPEARE_DIR)
+    assert sorted(shakespeare.poems) == ['1', '2']
+    lines = [entity.line.text for entity in shakespeare.poems['1'].entity]
+    assert len(lines) == 14
+    assert lines[0] == 'From fairest creatures we desire increase'
+    assert lines[-1].split()[-1] == 'thee'
+    sidney = DataLoader(generate_dataset.SIDNEY_DIR)
+    assert sorted(sidney.poems) == ['1', '2']
+    lines = [entity.line.text for entity in sidney.poems['1'].entity]
+    assert len(lines) == 14
+    assert lines[0].split()[:2] == ['Loving', 'in']
+
+    # Forget one poem: an offline run only ingests it again, from the
+    # page cache.
+    manifest = generate_dataset.SHAKESPEARE_DIR + generate_dataset.MANIFEST
+    with open(manifest, 'w') as manifest_file:
+        json.dump(['1'], manifest_file)
+    os.remove(generate_dataset.SHAKESPEARE_DIR + '2.txt')
+    first = generate_dataset.SHAKESPEARE_DIR + '1.txt'
+    mtime = os.stat(first).st_mtime_ns
+    generate(monkeypatch, '--shakespeare', '--offline')
+    assert sorted(DataLoader(generate_dataset.SHAKESPEARE_DIR).poems) == \
+        ['1', '2']
+    assert os.stat(first).st_mtime_ns == mtime
@@ -0,0 +1,79 @@
+'''
+Tests of the micro-batching of LabelingService.
+'''
+import copy
+import threading
+import time
+
+import pytest
+
+from labeling_service import LabelingService
+from proto.Poem_pb2 import Poem
+from rhyme_labeler import RhymeLabeler
+
+WORDS = ['day', 'night', 'way', 'light', 'love', 'sea', 'dove', 'me']
+RHYMES = {'day': ['way'], 'way': ['day'], 'night': ['light'],
+          'light': ['night'], 'love': ['dove'], 'dove': ['love'],
+          'sea': ['me'], 'me': ['sea']}
+
+def make_poem(title, words):
+    poem = Poem()
+    poem.title = title
+    for word in words:
+        line = poem.entity.add().line
+        line.text = 'a line ending in ' + word
+        line.end_word = word
+    return poem
+
+def make_labeler():
+    def add_rhymes(words, rhyme_dict):
+        for word in words:
+            rhyme_dict.setdefault(word, RHYMES.get(word, []))
+    return RhymeLabeler(add_rhymes)
+
+def label_in_thread(service, poems, errors):
+    def run():
+        try:
+            service.label(poems)
+        except Exception as error:
+            errors.append(error)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_failed_batch_is_retried_per_request():
+    service = LabelingService(make_labeler(), max_wait=1.0)
+    good = [make_poem(str(i), WORDS) for i in range(3)]
+    # A line without an end word or text cannot be labeled.
+    bad = Poem()
+    bad.title = 'bad'
+    bad.entity.add().line.text = ''
+    expected = copy.deepcopy(good)
+    make_labeler().label_corpus(expected)
+
+    good_errors, bad_errors = [], []
+    threads = [label_in_thread(service, good, good_errors),
+               label_in_thread(service, [bad], bad_errors)]
+    # Queue both requests before serving, so they share a batch.
+    deadline = time.time() + 10
+    while service._queue.qsize() < 2:
+        assert time.time() < deadline
+        time.sleep(0.001)
+    service.start()
+    for thread in threads:
+        thread.join()
+    service.stop()
+
+    assert good_errors == []
+    assert len(bad_errors) == 1
+    assert good == expected
+    assert all(poem.rhyme_sets for poem in good)
+    stats = service.stats()
+    assert stats['batches'] == 1
+    assert stats['requests'] == 2
+    assert stats['errors'] == 1
+
+def test_requires_an_option():
+    service = LabelingService(make_labeler())
+    with pytest.raises(ValueError):
+        service.label([make_poem('1', WORDS)], scheme=False, group=False)
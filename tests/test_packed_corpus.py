@@ -0,0 +1,58 @@
+'''
+Tests of the packed corpus format.
+'''
+import os
+
+import pytest
+
+from packed_corpus import (PackedCorpus, decode_delimited, encode_delimited,
+                           is_packed_corpus, pack_directory,
+                           unpack_to_directory, write_packed)
+from proto.Poem_pb2 import Poem
+
+def make_poem(title):
+    poem = Poem()
+    poem.title = title
+    poem.author = 'author'
+    poem.entity.add().line.text = 'the line of ' + title
+    return poem
+
+def test_delimited_round_trip():
+    records = [b'', b'a', b'x' * 300]
+    assert decode_delimited(encode_delimited(records)) == records
+    with pytest.raises(ValueError):
+        decode_delimited(encode_delimited(records)[:-1])
+
+def test_records_round_trip(tmp_path):
+    poems = [make_poem(str(i)) for i in range(1, 6)]
+    filename = str(tmp_path / 'corpus.pack')
+    write_packed(poems, filename)
+    assert is_packed_corpus(filename)
+    assert not is_packed_corpus(str(tmp_path))
+
+    corpus = PackedCorpus(filename)
+    assert list(corpus.index) == ['1', '2', '3', '4', '5']
+    assert corpus.read_record('3') == poems[2].SerializeToString()
+    assert ([data for title, data in corpus.iter_records()]
+            == [poem.SerializeToString() for poem in poems])
+    corpus.close()
+
+def test_directory_round_trip(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    poems = [make_poem(str(i)) for i in range(1, 4)]
+    for poem in poems:
+        (source / (poem.title + '.txt')).write_bytes(poem.SerializeToString())
+    filename = str(tmp_path / 'corpus.pack')
+    pack_directory(str(source), filename)
+    unpack_to_directory(filename, str(tmp_path / 'target'))
+    for poem in poems:
+        path = os.path.join(str(tmp_path / 'target'), poem.title + '.txt')
+        with open(path, 'rb') as poem_file:
+            assert poem_file.read() == poem.SerializeToString()
+
+def test_rejects_other_files(tmp_path):
+    filename = tmp_path / 'not.pack'
+    filename.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        PackedCorpus(str(filename))
@@ -0,0 +1,53 @@
+'''
+Tests of the sqlite-backed RhymeCache.
+'''
+from rhyme_cache import RhymeCache
+
+def test_rhymes_persist_across_instances(tmp_path):
+    filename = str(tmp_path / 'rhymes.db')
+    cache = RhymeCache(filename)
+    cache['day'] = ['way', 'say']
+    cache.update_many({'night': ['light'], 'love': []})
+    cache.close()
+
+    cache = RhymeCache(filename)
+    assert cache['day'] == ['way', 'say']
+    assert cache['night'] == ['light']
+    assert cache['love'] == []
+    assert sorted(cache) == ['day', 'love', 'night']
+    cache.close()
+
+def test_memory_is_bounded(tmp_path):
+    cache = RhymeCache(str(tmp_path / 'rhymes.db'), max_entries=2)
+    for word in ['a', 'b', 'c', 'd']:
+        cache[word] = [word + word]
+    assert cache.stats()['in_memory'] == 2
+    assert cache.stats()['evictions'] == 2
+    # Evicted words are read back from disk.
+    assert cache['a'] == ['aa']
+    assert len(cache) == 4
+    cache.close()
+
+def test_has_does_not_count(tmp_path):
+    cache = RhymeCache(str(tmp_path / 'rhymes.db'))
+    cache['day'] = ['way']
+    assert cache.has('day')
+    assert not cache.has('night')
+    assert cache.stats()['hits'] == 0
+    assert cache.stats()['misses'] == 0
+    assert 'night' not in cache
+    assert cache.stats()['misses'] == 1
+    cache.close()
+
+def test_version_changes_on_replace_and_delete(tmp_path):
+    cache = RhymeCache(str(tmp_path / 'rhymes.db'))
+    cache['day'] = ['way']
+    version = cache.version
+    cache['night'] = ['light']
+    assert cache.version == version
+    cache['day'] = ['say']
+    assert cache.version > version
+    version = cache.version
+    del cache['night']
+    assert cache.version > version
+    cache.close()
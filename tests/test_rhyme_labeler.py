@@ -0,0 +1,166 @@
+'''
+Tests that RhymeLabeler labels sonnets as the original implementation
+did, one by one and with label_corpus.
+'''
+import copy
+import random
+
+import pytest
+
+from proto.Poem_pb2 import Poem
+from rhyme_labeler import RhymeLabeler
+
+# The labeling of the original RhymeLabeler, which looked every pair of
+# lines up in the rhyme dictionary and built networkx graphs.
+TWO_SCHEMES = [[[0,1]]]
+FOUR_SCHEMES = [[[0,3],[1,2]], [[0,2],[1,3]],[[0,1],[2,3]]]
+SIX_SCHEMES = [[[0,3],[1,4],[2,5]],[[0,1],[2,5],[3,4]]]
+
+def _components(nodes, edges):
+    neighbors = {node: set() for node in nodes}
+    for i, j in edges:
+        neighbors[i].add(j)
+        neighbors[j].add(i)
+    components = []
+    seen = set()
+    for node in nodes:
+        if node in seen:
+            continue
+        component, stack = [], [node]
+        seen.add(node)
+        while stack:
+            i = stack.pop()
+            component.append(i)
+            for j in neighbors[i] - seen:
+                seen.add(j)
+                stack.append(j)
+        components.append(component)
+    return components
+
+def _pick_rhyme_scheme(words, possible_schemes, rhyme_dict):
+    best_score = 0
+    best_scheme = possible_schemes[0]
+    for scheme in possible_schemes:
+        score = sum(1 for i, j in scheme
+                    if words[j] in rhyme_dict[words[i]]
+                    or words[i] in rhyme_dict[words[j]])
+        if score > best_score:
+            best_scheme, best_score = scheme, score
+    return best_scheme, best_score
+
+def _shift(scheme, shift_num):
+    return [[i + shift_num for i in pair] for pair in scheme]
+
+def _sonnet_scheme(words, rhyme_dict):
+    scheme_q1, score_q1 = _pick_rhyme_scheme(words[0:4], FOUR_SCHEMES,
+                                             rhyme_dict)
+    scheme_q2, score_q2 = _pick_rhyme_scheme(words[4:8], FOUR_SCHEMES,
+                                             rhyme_dict)
+    scheme_octave = scheme_q1 if score_q1 > score_q2 else scheme_q2
+    octave = scheme_octave + _shift(scheme_octave, 4)
+    scheme_quatrain_3, score_quatrain_3 = _pick_rhyme_scheme(
+        words[4:12], FOUR_SCHEMES, rhyme_dict)
+    scheme_couplet_3, score_couplet_3 = _pick_rhyme_scheme(
+        words[12:], TWO_SCHEMES, rhyme_dict)
+    scheme_sestet_3, score_sestet_3 = _pick_rhyme_scheme(
+        words[8:], SIX_SCHEMES, rhyme_dict)
+    if score_sestet_3 > score_quatrain_3 + score_couplet_3:
+        scheme_sestet = scheme_sestet_3
+    else:
+        scheme_sestet = scheme_quatrain_3 + [[4,5]]
+    return octave + _shift(scheme_sestet, 8)
+
+def _rhyme_groups(words, rhyme_dict):
+    return _components(range(len(words)),
+                       [(i, j) for i in range(len(words))
+                        for j in range(len(words))
+                        if words[j] in rhyme_dict[words[i]]])
+
+def _combine_schemes(rhyme_scheme, rhyme_scheme_2):
+    edges = [(group[i], group[j]) for group in rhyme_scheme + rhyme_scheme_2
+             for i in range(len(group)) for j in range(i + 1, len(group))]
+    nodes = []
+    for edge in edges:
+        nodes.extend(i for i in edge if i not in nodes)
+    return _components(nodes, edges)
+
+def baseline_rhyme_scheme(words, rhyme_dict, scheme, group):
+    if scheme and not group:
+        rhyme_scheme = _sonnet_scheme(words, rhyme_dict)
+    elif group and not scheme:
+        rhyme_scheme = _rhyme_groups(words, rhyme_dict)
+    else:
+        rhyme_scheme = _combine_schemes(_sonnet_scheme(words, rhyme_dict),
+                                        _rhyme_groups(words, rhyme_dict))
+    return sorted([sorted(group) for group in rhyme_scheme],
+                  key=lambda x: x[0])
+
+MODES = [(True, False), (False, True), (True, True)]
+VOCABULARY = ['w%d' % i for i in range(40)]
+
+@pytest.fixture(scope='module')
+def rhyme_dict():
+    # Asymmetric and not transitive, as looked up rhymes are.
+    rand = random.Random(7)
+    return {word: rand.sample(VOCABULARY, rand.randint(0, 5))
+            for word in VOCABULARY}
+
+def make_poem(title, words):
+    poem = Poem()
+    poem.title = title
+    for i, word in enumerate(words):
+        line = poem.entity.add().line
+        line.text = 'line ending with ' + word
+        line.index = i
+        line.end_word = word
+    return poem
+
+def make_poems(num_poems, length, seed):
+    rand = random.Random(seed)
+    return [make_poem(str(i), [rand.choice(VOCABULARY)
+                               for _ in range(length)])
+            for i in range(num_poems)]
+
+def make_labeler(rhyme_dict):
+    def add_rhymes(words, labeler_dict):
+        for word in words:
+            labeler_dict.setdefault(word, rhyme_dict[word])
+    return RhymeLabeler(add_rhymes)
+
+def words_of(poem):
+    return [entity.line.end_word for entity in poem.entity]
+
+@pytest.mark.parametrize('scheme, group', MODES)
+def test_get_rhyme_scheme_matches_baseline(rhyme_dict, scheme, group):
+    labeler = make_labeler(rhyme_dict)
+    for poem in make_poems(500, 14, seed=1):
+        assert (labeler.get_rhyme_scheme(poem, scheme, group)
+                == baseline_rhyme_scheme(words_of(poem), rhyme_dict,
+                                         scheme, group))
+
+@pytest.mark.parametrize('length', [4, 9, 16])
+def test_group_labeling_of_other_lengths_matches_baseline(rhyme_dict,
+                                                          length):
+    labeler = make_labeler(rhyme_dict)
+    for poem in make_poems(100, length, seed=length):
+        assert (labeler.get_rhyme_scheme(poem, False, True)
+                == baseline_rhyme_scheme(words_of(poem), rhyme_dict,
+                                         False, True))
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('scheme, group', MODES)
+def test_label_corpus_matches_baseline(rhyme_dict, scheme, group, workers):
+    poems = make_poems(200, 14, seed=2)
+    expected = [baseline_rhyme_scheme(words_of(poem), rhyme_dict, scheme,
+                                      group)
+                for poem in poems]
+    labeled = copy.deepcopy(poems)
+    assert make_labeler(rhyme_dict).label_corpus(
+        labeled, scheme, group, workers=workers) == expected
+    assert [[list(rhyme_set.rhyme_indices) for rhyme_set in poem.rhyme_sets]
+            for poem in labeled] == expected
+
+def test_rhyming_option_is_required(rhyme_dict):
+    with pytest.raises(ValueError):
+        make_labeler(rhyme_dict).get_rhyme_scheme(
+            make_poems(1, 14, seed=3)[0], False, False)
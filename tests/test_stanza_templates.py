@@ -0,0 +1,56 @@
+'''
+Tests of the stanza segmentation of label_stanzas.
+'''
+import functools
+import random
+
+from stanza_templates import STANZA_PATTERNS, _score_scheme, label_stanzas
+
+# Words rhyme when they end with the same digit.
+NUM_CLASSES = 4
+
+def do_rhyme(word, other_word):
+    return word[-1] == other_word[-1]
+
+def brute_force_score(words):
+    '''
+    The best score of every segmentation of words into stanzas and
+    unlabeled lines.
+    '''
+    @functools.lru_cache(maxsize=None)
+    def best(start):
+        if start == len(words):
+            return 0
+        scores = [best(start + 1)]
+        for pattern in STANZA_PATTERNS:
+            if start + pattern.length <= len(words):
+                scores.append(best(start + pattern.length) + max(
+                    _score_scheme(words, start, scheme, do_rhyme)
+                    for scheme in pattern.schemes))
+        return max(scores)
+    return best(0)
+
+def scheme_score(words, rhyme_scheme):
+    return sum(do_rhyme(words[i], words[j]) for group in rhyme_scheme
+               for i, j in zip(group, group[1:]))
+
+def test_couplets():
+    words = ['day0', 'way0', 'night1', 'light1']
+    assert label_stanzas(words, do_rhyme) == ([[0, 1], [2, 3]], 2)
+
+def test_unrhymed_lines_are_unlabeled():
+    assert label_stanzas(['a0', 'b1', 'c2'], do_rhyme) == ([], 0)
+    assert label_stanzas([], do_rhyme) == ([], 0)
+
+def test_matches_brute_force():
+    rand = random.Random(5)
+    for _ in range(300):
+        words = ['w%d' % rand.randrange(NUM_CLASSES)
+                 for _ in range(rand.randint(1, 18))]
+        rhyme_scheme, score = label_stanzas(words, do_rhyme)
+        assert score == brute_force_score(words)
+        assert scheme_score(words, rhyme_scheme) == score
+        lines = [i for group in rhyme_scheme for i in group]
+        assert len(lines) == len(set(lines))
+        assert [group[0] for group in rhyme_scheme] == sorted(
+            group[0] for group in rhyme_scheme)
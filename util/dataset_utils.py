@@ -8,7 +8,25 @@ import sys
 sys.path.append('../')
 
 from collections import OrderedDict
-from proto.Poem_pb2 import *
+
+# Punctuation and digits, deleted from cleaned lines with one
+# precompiled table. End words are only stripped of them at their
+# ends, so that elisions keep their apostrophes.
+_STRIPPED = string.punctuation + string.digits
+_CLEAN_TABLE = str.maketrans('', '', _STRIPPED)
+
+# Maps typographic apostrophes to plain ones.
+_APOSTROPHES = str.maketrans({'\u2019': "'", '\u2018': "'"})
+
+# Elided endings of end words and their spelled-out forms, e.g.
+# "lov'd" -> "loved", "know'st" -> "knowest", "heav'n" -> "heaven".
+_ELISIONS = [("'d", "ed"), ("'st", "est"), ("'n", "en")]
+
+# Contractions that end like elisions but are not past tenses, e.g.
+# "i'd" is not "ied".
+_CONTRACTIONS = frozenset(["i'd", "you'd", "he'd", "she'd", "it'd", "we'd",
+                           "they'd", "thou'd", "ye'd", "who'd", "that'd",
+                           "there'd", "what'd", "where'd", "how'd"])
 
 '''
 Get the roman numeral representation of an integer.
@@ -46,33 +64,74 @@ def GetRoman(num):
 '''
 Generate a Poem proto from the lines of the poem, its title,
 and its author. Meant for use during the ingestion process.
-Will not generate stanzas.
+Will not generate stanzas. Every line gets its normalized end word.
 ::param:: lines the lines of the poem.
 '''
 def GeneratePoem(sentences, title, author, verbose):
+    from proto.Poem_pb2 import Poem
     poem = Poem()
     poem.title = title
     poem.author = author
     j = 0
     for sentence in sentences:
         if len(sentence.strip()) != 0:
-            line = Line()
+            line = poem.entity.add().line
             line.text = _CleanLine(sentence)
             line.index = j
+            line.end_word = _LastEndWord(sentence.split())
             j+=1
-            entity = poem.entity.add()
-            entity.line.CopyFrom(line)
     if verbose:
         print('Generated poem %s by %s.' % (poem.title, poem.author))
     return poem
 
 '''
-Remove superfluous punctuation and digits from a line of poetry.
+Normalize the last word of a line for rhyme lookups: lowercase it,
+use plain apostrophes and spell out elided endings of past tenses.
+::param:: word the last word of a line, stripped of punctuation.
+::return:: the normalized end word.
+'''
+def NormalizeEndWord(word):
+    word = word.translate(_APOSTROPHES).lower()
+    if word in _CONTRACTIONS:
+        return word
+    for elision, ending in _ELISIONS:
+        if word.endswith(elision) and len(word) > len(elision):
+            return word[:-len(elision)] + ending
+    return word
+
+'''
+Fill in the end words of a poem generated before lines had them.
+::param:: poem the Poem proto to update.
+'''
+def SetEndWords(poem):
+    for entity in poem.entity:
+        entity.line.end_word = _LastEndWord(entity.line.text.split())
+
+'''
+Get the normalized last word of a line that is not only punctuation
+and digits.
+::param:: words the words of the line, split on whitespace.
+'''
+def _LastEndWord(words):
+    for word in reversed(words):
+        word = word.strip(_STRIPPED)
+        if word:
+            return NormalizeEndWord(word)
+    return ''
+
+'''
+Remove punctuation and digits from the words of a line.
+::param:: line the line to clean
+::return:: the cleaned words; words made only of punctuation and
+digits are dropped.
+'''
+def _CleanWords(line):
+    return line.translate(_CLEAN_TABLE).split()
+
+'''
+Remove punctuation and digits from a line of poetry.
 ::param:: line the line to clean
 ::return:: the cleaned line
 '''
 def _CleanLine(line):
-    words = [x.strip().strip(string.punctuation).strip(string.digits)
-             for x in line.split()]
-    s = ' '.join(words)
-    return s
+    return ' '.join(_CleanWords(line))
@@ -0,0 +1,145 @@
+''' Defines fetching utilities for ingestion: a concurrent page fetcher
+with an on-disk cache of raw pages, and a manifest of ingested poems so
+interrupted runs can resume.
+::author:: Kara Schechtman
+::version:: 2.0
+'''
+import hashlib
+import json
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+'''
+Write data to a file through a temporary file, so the file is never
+left half-written.
+::param:: path the file to write.
+::param:: data the bytes to write.
+'''
+def WriteAtomically(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as store:
+        store.write(data)
+    os.replace(tmp_path, path)
+
+'''
+Point a URL at another server or directory, keeping its path.
+::param:: url the URL to rewrite.
+::param:: base_url the replacement for the URL's scheme and host, e.g.
+"http://localhost:8000/" or "file:///path/to/saved/pages/".
+::return:: the rewritten URL.
+'''
+def RebaseUrl(url, base_url):
+    parts = urlsplit(url)
+    path = parts.path.lstrip('/')
+    if parts.query:
+        path += '?' + parts.query
+    return base_url.rstrip('/') + '/' + path
+
+'''
+On-disk cache of raw pages, keyed by URL.
+'''
+class PageCache(object):
+
+    '''
+    ::param:: dir the directory to keep pages in; created if missing.
+    '''
+    def __init__(self, dir):
+        self._dir = dir
+        os.makedirs(dir, exist_ok=True)
+
+    def _Path(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self._dir, name + '.html')
+
+    '''
+    ::return:: the cached page of a URL, or None.
+    '''
+    def Get(self, url):
+        path = self._Path(url)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as page:
+            return page.read()
+
+    '''
+    Cache the page of a URL.
+    '''
+    def Put(self, url, data):
+        WriteAtomically(self._Path(url), data)
+
+'''
+Fetch pages concurrently, serving them from a cache when possible.
+::param:: urls the URLs to fetch.
+::param:: cache a PageCache, or None to always fetch.
+::param:: workers the maximum number of concurrent fetches.
+::param:: retries how many times to retry a failed fetch.
+::param:: backoff seconds before the first retry, doubled for each
+further retry.
+::param:: base_url if set, fetch from this server or directory instead
+(see RebaseUrl). Pages are still cached under their original URL.
+::param:: offline if True, never fetch; missing pages raise IOError.
+::return:: a dictionary from URLs to page contents.
+'''
+def FetchPages(urls, cache=None, workers=DEFAULT_WORKERS,
+               retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+               base_url=None, offline=False):
+    from urllib.request import urlopen
+
+    def Fetch(url):
+        if cache is not None:
+            data = cache.Get(url)
+            if data is not None:
+                return data
+        if offline:
+            raise IOError('%s is not cached.' % url)
+        source = RebaseUrl(url, base_url) if base_url else url
+        for attempt in range(retries + 1):
+            try:
+                with urlopen(source) as page:
+                    data = page.read()
+                break
+            except IOError:
+                if attempt == retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+        if cache is not None:
+            cache.Put(url, data)
+        return data
+
+    urls = list(urls)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(urls, executor.map(Fetch, urls)))
+
+'''
+Record of the poems already ingested into a directory, saved after
+every poem so an interrupted ingestion can resume where it stopped.
+'''
+class Manifest(object):
+
+    '''
+    ::param:: path the manifest file; read if it exists.
+    '''
+    def __init__(self, path):
+        self._path = path
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, 'r') as manifest:
+                self._done = set(json.load(manifest))
+
+    def Contains(self, title):
+        return title in self._done
+
+    '''
+    Record that a poem was ingested.
+    '''
+    def Add(self, title):
+        self._done.add(title)
+        WriteAtomically(self._path,
+                        json.dumps(sorted(self._done)).encode('utf-8'))